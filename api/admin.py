@@ -1,20 +1,92 @@
 from django.contrib import admin
+from django.contrib.gis.geos import GeometryCollection
+from django.contrib.postgres.search import SearchQuery
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.html import format_html
 from .models import Trail, TrailSegment, WeatherAlert, UserWeatherAlert
-from .forms import TrailSegmentInlineForm
 from leaflet.admin import LeafletGeoAdmin
+from leaflet.forms.widgets import LeafletWidget
 
-class TrailSegmentInline(admin.TabularInline):
-    model = TrailSegment
-    form = TrailSegmentInlineForm
-    extra = 0
-    verbose_name_plural = "Trail Segments"
-    verbose_name = "Trail Segment"
 
-class TrailAdmin(LeafletGeoAdmin):
-    list_display = ["name", "activity", "length_km"]
-    inlines = [TrailSegmentInline]
+class ChangelistFieldsMixin:
+    # Columns the changelist displays; every other column (the routes above
+    # all) is deferred on changelist pages only, as change forms need them
+    changelist_fields = ()
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if self.changelist_fields and match and match.url_name.endswith('_changelist'):
+            queryset = queryset.only(*self.changelist_fields)
+        return queryset
+
+
+class OverviewMapWidget(LeafletWidget):
+    # Read-only map; its scripts come with the route field's admin widget
+    geom_type = 'GEOMETRYCOLLECTION'
+    modifiable = False
+
+
+class TrailAdmin(ChangelistFieldsMixin, LeafletGeoAdmin):
+    list_display = ["name", "activity", "county", "length_km"]
+    # Both served by the (activity, id) and (county, id) listing indexes
+    list_filter = ["activity", "county"]
+    list_per_page = 50
+    changelist_fields = ["id", "name", "activity", "county", "length_km"]
+    show_full_result_count = False
+    search_fields = ["name"]
+    exclude = ["route_medium", "route_low"]
+    readonly_fields = ["overview_map", "segment_list"]
+
+    def get_search_results(self, request, queryset, search_term):
+        # Full-text matches through the search_vector GIN index, or names
+        # containing the term ("Glen" finds Glendalough) through
+        # trail_name_trgm_idx, rather than scanning every name
+        if not search_term:
+            return queryset, False
+        query = SearchQuery(search_term, config='english', search_type='websearch')
+        return queryset.filter(Q(search_vector=query) | Q(name__trigram_word_similar=search_term)), False
+
+    def save_model(self, request, obj, form, change):
+        if 'route' in form.changed_data:
+            for field, route in Trail.simplified_routes(obj.route).items():
+                setattr(obj, field, route)
+        super().save_model(request, obj, form, change)
+
+    @admin.display(description="Route and segments")
+    def overview_map(self, trail):
+        # One map with the simplified route and the segment points instead
+        # of two editable maps per segment
+        if trail.pk is None:
+            return "-"
+        points = trail.segments.filter(segment_point__isnull=False).order_by('segment_index') \
+                               .values_list('segment_point', flat=True)
+        geometry = GeometryCollection(trail.route_low or trail.route, *points, srid=4326)
+        return OverviewMapWidget().render('overview_map', geometry, attrs={'id': 'id_overview_map'})
+
+    @admin.display(description="Segments")
+    def segment_list(self, trail):
+        if trail.pk is None:
+            return "-"
+        url = reverse('admin:api_trailsegment_changelist') + f'?trail__id__exact={trail.pk}'
+        return format_html('<a href="{}">{} segments</a>', url, trail.segments.count())
+
+
+class TrailSegmentAdmin(ChangelistFieldsMixin, LeafletGeoAdmin):
+    list_display = ["trail", "segment_index", "start_distance_km", "end_distance_km"]
+    list_select_related = ["trail"]
+    list_per_page = 100
+    changelist_fields = [
+        "id", "segment_index", "start_distance_km", "end_distance_km", "trail__name", "trail__object_id",
+    ]
+    show_full_result_count = False
+    # In the order of segment_trail_index_idx
+    ordering = ["trail", "segment_index"]
+    raw_id_fields = ["trail"]
+
 
 admin.site.register(Trail, TrailAdmin)
 admin.site.register(WeatherAlert)
 admin.site.register(UserWeatherAlert)
-admin.site.register(TrailSegment, LeafletGeoAdmin)
\ No newline at end of file
+admin.site.register(TrailSegment, TrailSegmentAdmin)
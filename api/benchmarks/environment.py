@@ -0,0 +1,41 @@
+"""
+Throwaway database and upstream stub shared by the benchmark_api and
+check_query_plans commands and the query plan tests.
+"""
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from ..models import Trail, UserWeatherAlert
+from .seed import seed_benchmark_data
+from .stub_server import StubUpstreamServer
+
+
+@contextmanager
+def seeded_environment(trail_count, keepdb=False, latency=0, log=print, create_db=True):
+    """
+    Creates the test database, seeds it unless it already holds trails,
+    and routes upstream calls to a StubUpstreamServer. Yields the scenario
+    context and the stub; the database is destroyed on exit unless keepdb.
+    With create_db=False the current (test runner's) database is seeded
+    and left in place.
+    """
+    if create_db:
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        if not Trail.objects.exists():
+            log(f"Seeding {trail_count} trails...")
+            seed_benchmark_data(trail_count)
+        context = {'user_alert_id': UserWeatherAlert.objects.values_list('id', flat=True).first()}
+
+        with StubUpstreamServer(latency=latency) as stub, override_settings(
+            UPSTREAM_OVERRIDES=stub.overrides, UPSTREAM_RATE_LIMITS={},
+        ):
+            yield context, stub
+    finally:
+        if create_db:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+            teardown_test_environment()
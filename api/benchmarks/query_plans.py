@@ -0,0 +1,101 @@
+"""
+Query plan checks, run by QueryPlanTests (api/tests.py) and the
+check_query_plans command.
+
+Every API route's scenario is issued against the seeded database, each
+SELECT it runs is EXPLAINed with sequential scans disabled, and the plan
+must reach watched tables through an index and a bounded number of rows.
+"""
+import json
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from ..models import GeocodeEntry, SegmentForecast, Trail, TrailSegment, WeatherAlert
+from ..urls import urlpatterns
+from .scenarios import SCENARIOS, UNMEASURED, issue, reset_caches
+
+# Tables large enough in production that a query must reach them through an index
+WATCHED_TABLES = {model._meta.db_table for model in (Trail, TrailSegment, SegmentForecast, WeatherAlert, GeocodeEntry)}
+
+# Routes that legitimately read a whole table
+FULL_SCANS = {
+    "activities/trails/all": {Trail._meta.db_table},
+    "location-suggestions/": {Trail._meta.db_table, GeocodeEntry._meta.db_table},  # Builds the in-process index
+    "activities/trails/clusters/": {Trail._meta.db_table},  # A low zoom tile covers most trails; cached per tile
+}
+
+# Plan nodes that consume all of their input, so a Limit above them does not bound the scans below
+BLOCKING_NODES = {"Sort", "Hash", "Aggregate", "Materialize", "WindowAgg", "SetOp"}
+
+MAX_ROW_FRACTION = 0.5  # Of the table, per scan
+MIN_ROW_BUDGET = 100  # Estimates up to this many rows always pass, for tiny tables
+
+
+def routes():
+    """(route, scenario or None) for every measurable API route."""
+    for pattern in urlpatterns:
+        route = str(pattern.pattern)
+        if route not in UNMEASURED:
+            yield route, SCENARIOS.get(route)
+
+
+def table_rows():
+    """{watched table: estimated rows}, after refreshing the statistics."""
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+        cursor.execute("SELECT relname, reltuples FROM pg_class WHERE relname = ANY(%s)", [list(WATCHED_TABLES)])
+        return dict(cursor.fetchall())
+
+
+def route_queries(client, scenario, context):
+    """The distinct SELECTs a cold request for the scenario runs."""
+    reset_caches()
+    with CaptureQueriesContext(connection) as captured:
+        issue(client, scenario(context))
+    return sorted({query["sql"] for query in captured.captured_queries
+                   if query["sql"].lstrip().upper().startswith(("SELECT", "WITH"))})
+
+
+def explain(sql):
+    """
+    EXPLAIN with sequential scans disabled: the planner then only picks one
+    when no index can answer the query, whatever the table size.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+        result = cursor.fetchone()[0]
+        # Inside an outer transaction (a TestCase) SET LOCAL would outlive
+        # the released savepoint and slow down the following requests
+        cursor.execute("SET LOCAL enable_seqscan = on")
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]["Plan"]
+
+
+def walk_plan(node, limit=None):
+    """Yields (node, rows a Limit above it lets through or None) for every node of a plan."""
+    if node["Node Type"] == "Limit":
+        limit = node["Plan Rows"] if limit is None else min(limit, node["Plan Rows"])
+    elif node["Node Type"] in BLOCKING_NODES:
+        limit = None
+    yield node, limit
+    for child in node.get("Plans", []):
+        yield from walk_plan(child, limit)
+
+
+def check_plan(route, plan, rows_by_table, max_row_fraction=MAX_ROW_FRACTION, min_row_budget=MIN_ROW_BUDGET):
+    """Yields a description of each problem in the plan of a query the route runs."""
+    allowed = FULL_SCANS.get(route, set())
+    for node, limit in walk_plan(plan):
+        table = node.get("Relation Name")
+        if table not in WATCHED_TABLES or table in allowed:
+            continue
+        if node["Node Type"] == "Seq Scan":
+            yield f"sequential scan on {table}"
+            continue
+        rows = node["Plan Rows"] if limit is None else min(node["Plan Rows"], limit)
+        budget = max(min_row_budget, max_row_fraction * rows_by_table.get(table, 0))
+        if rows > budget:
+            yield f"{node['Node Type']} on {table} estimated at {rows:.0f} rows (budget {budget:.0f})"
@@ -0,0 +1,91 @@
+"""
+One representative request per route in api/urls.py.
+
+SCENARIOS maps the route pattern string to a function taking the seed
+context and returning the request to issue. The benchmark command warns
+about routes without a scenario (unless listed in UNMEASURED) so new
+endpoints don't go unmeasured.
+"""
+import json
+
+from django.core.cache import cache
+
+from ..models import GeocodeEntry
+from ..utils import location_index
+
+LAT, LON = 53.3498, -6.2603  # Dublin
+FORECAST_START = "2026-10-19T09:00:00"  # Inside the recorded forecast
+
+WEATHER_SAMPLE = [{"temperature": 12.0, "cloudiness": 80, "wind_speed": 20, "rain": 1.2}]
+
+
+def get(path, **params):
+    return {"method": "GET", "path": path, "params": params}
+
+
+def post(path, body):
+    return {"method": "POST", "path": path, "body": body}
+
+
+SCENARIOS = {
+    "weather/": lambda ctx: get("/api/weather/", lat=LAT, lon=LON),
+    "address/": lambda ctx: get("/api/address/", address="Dublin"),
+    "reverse-address/": lambda ctx: get("/api/reverse-address/", latitude=LAT, longitude=LON),
+    "directions/": lambda ctx: get(
+        "/api/directions/", weather="true", depart=FORECAST_START, **{"from": f"{LAT},{LON}", "to": "53.2707,-9.0568"},
+    ),
+    "solar/": lambda ctx: get("/api/solar/", lat=LAT, lon=LON, days=14),
+    "weather-alerts/": lambda ctx: get("/api/weather-alerts/", lat=LAT, lon=LON),
+    "weather-alerts/trails/": lambda ctx: get("/api/weather-alerts/trails/", detail="low"),
+    "user-weather-alerts/": lambda ctx: get("/api/user-weather-alerts/"),
+    "user-weather-alerts/<int:alert_id>/": lambda ctx: get(f"/api/user-weather-alerts/{ctx['user_alert_id']}/"),
+    "user-weather-alerts/check/": lambda ctx: post("/api/user-weather-alerts/check/", {"weather_data": WEATHER_SAMPLE}),
+    "activities/trails/": lambda ctx: get(
+        "/api/activities/trails/", activity="Walking", min_length=5, bbox="-10.5,51.4,-5.4,55.4", detail="low",
+    ),
+    "activities/trails/all": lambda ctx: get("/api/activities/trails/all"),
+    "activities/trails/along-route/": lambda ctx: get(
+        "/api/activities/trails/along-route/", distance=5, detail="low", **{"from": f"{LAT},{LON}", "to": "53.2707,-9.0568"},
+    ),
+    "activities/trails/clusters/": lambda ctx: get("/api/activities/trails/clusters/", bbox="-10.5,51.4,-5.4,55.4", zoom=7),
+    "activities/trails/search/": lambda ctx: get("/api/activities/trails/search/", q="glendalogh loop", lat=LAT, lon=LON),
+    "activities/trails/top/": lambda ctx: get("/api/activities/trails/top/", lat=LAT, lon=LON),
+    "activities/trails/top/cycles/": lambda ctx: get("/api/activities/trails/top/cycles/", lat=LAT, lon=LON),
+    "activities/trails/top/walks/": lambda ctx: get("/api/activities/trails/top/walks/", lat=LAT, lon=LON),
+    "activities/trails/top/batch/": lambda ctx: post("/api/activities/trails/top/batch/", {"origins": [
+        {"lat": LAT, "lon": LON},
+        {"lat": 53.2707, "lon": -9.0568, "activity": "Walking"},
+        {"lat": 51.8985, "lon": -8.4756, "activity": "Cycling", "limit": 10},
+    ]}),
+    "activities/trails/top/weather-segments/": lambda ctx: get(
+        "/api/activities/trails/top/weather-segments/",
+        lat=LAT, lon=LON, datetime=FORECAST_START, activity_type="Walking", max_distance=100,
+    ),
+    "activities/trails/best-start-times/": lambda ctx: get(
+        "/api/activities/trails/best-start-times/", lat=LAT, lon=LON, datetime=FORECAST_START, max_distance=100,
+    ),
+    "activities/trails/<int:object_id>/alerts/": lambda ctx: get("/api/activities/trails/900000/alerts/"),
+    "location-suggestions/": lambda ctx: get("/api/location-suggestions/", query="galwy"),
+}
+
+
+# Routes that can't be measured request by request
+UNMEASURED = {
+    "alerts/stream/",  # Long-lived SSE stream, ASGI only
+}
+
+
+def reset_caches():
+    """Puts the app back in a cold state: empty cache and in-process indexes."""
+    cache.clear()
+    location_index._index = None
+    GeocodeEntry.objects.all().delete()
+
+
+def issue(client, request):
+    if request["method"] == "GET":
+        return client.get(request["path"], request["params"])
+    return client.generic(
+        request["method"], request["path"],
+        data=json.dumps(request["body"]), content_type="application/json",
+    )
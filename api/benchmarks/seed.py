@@ -0,0 +1,101 @@
+"""
+Deterministic synthetic dataset for benchmarks.
+
+Trails are random walks scattered across Ireland, with segments generated
+exactly as generate_trail_segments does, plus a couple of weather alerts
+and user alerts so every route has data to work on.
+"""
+import math
+import random
+from datetime import timedelta
+
+from django.contrib.gis.geos import LineString, Point
+from django.utils import timezone
+
+from ..management.commands.generate_trail_segments import Command as GenerateTrailSegments
+from ..models import Trail, TrailSegment, UserWeatherAlert, WeatherAlert
+from ..utils.alert_impacts import rebuild_alert_impacts
+
+IRELAND_BOUNDS = (-10.3, 51.5, -6.0, 55.3)  # min lon, min lat, max lon, max lat
+
+COUNTIES = ["Dublin", "Wicklow", "Kerry", "Cork", "Galway", "Mayo", "Donegal", "Clare",
+            "Tipperary", "Waterford", "Kilkenny", "Sligo", "Laois", "Offaly", "Meath"]
+TOWNS = ["Bray", "Glendalough", "Killarney", "Kenmare", "Clifden", "Westport", "Dingle",
+         "Cobh", "Kinsale", "Lahinch", "Doolin", "Cahir", "Dungarvan", "Thomastown",
+         "Strandhill", "Portlaoise", "Birr", "Trim", "Letterkenny", "Ennis"]
+ACTIVITIES = ["Walking", "Walking", "Walking", "Cycling", "Cycling", "Horse Sport",
+              "Canoeing/Kayaking/Paddling"]
+DIFFICULTIES = ["Easy", "Moderate", "Strenuous", "Very Difficult"]
+
+
+def haversine_km(a, b):
+    lon1, lat1, lon2, lat2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+
+def random_route(rng):
+    min_lon, min_lat, max_lon, max_lat = IRELAND_BOUNDS
+    lon, lat = rng.uniform(min_lon, max_lon), rng.uniform(min_lat, max_lat)
+    heading = rng.uniform(0, 2 * math.pi)
+    coords = [(lon, lat)]
+    for _ in range(rng.randint(30, 600)):
+        heading += rng.gauss(0, 0.3)
+        lon += 0.003 * math.cos(heading)
+        lat += 0.002 * math.sin(heading)
+        coords.append((round(lon, 6), round(lat, 6)))
+    return coords
+
+
+def seed_benchmark_data(trail_count=500, seed=0):
+    """
+    Creates `trail_count` trails with segments, alerts and user alerts.
+    Returns a dict of ids and coordinates the scenarios refer to.
+    """
+    rng = random.Random(seed)
+    trails = []
+    for i in range(trail_count):
+        coords = random_route(rng)
+        route = LineString(coords, srid=4326)
+        county = rng.choice(COUNTIES)
+        trails.append(Trail(
+            object_id=900000 + i,
+            name=f"{rng.choice(TOWNS)} Loop {i}",
+            county=county,
+            activity=rng.choice(ACTIVITIES),
+            description=f"Synthetic benchmark trail {i} in County {county}.",
+            length_km=round(sum(haversine_km(a, b) for a, b in zip(coords, coords[1:])), 2),
+            difficulty=rng.choice(DIFFICULTIES),
+            trail_type="Looped",
+            nearest_town_start=rng.choice(TOWNS),
+            nearest_town_finish=rng.choice(TOWNS),
+            route=route,
+            **Trail.simplified_routes(route),
+        ))
+    Trail.objects.bulk_create(trails, batch_size=200)
+
+    segment_builder = GenerateTrailSegments()
+    segments = []
+    for trail in Trail.objects.filter(object_id__gte=900000):
+        segments.extend(segment_builder.compute_trail_segments(trail))
+    TrailSegment.objects.bulk_create(segments, batch_size=1000)
+
+    now = timezone.now()
+    WeatherAlert.objects.create(
+        title="Status Yellow - Wind warning",
+        description="Benchmark alert",
+        severity="LOW",
+        location=Point(-6.26, 53.35, srid=4326),
+        radius_km=40,
+        start_time=now,
+        end_time=now + timedelta(days=1),
+    )
+    rebuild_alert_impacts()
+    user_alert = UserWeatherAlert.objects.create(
+        name="Benchmark rain alert",
+        condition="RAINY",
+        threshold=0.5,
+        comparison="GT",
+        location=Point(-6.26, 53.35, srid=4326),
+    )
+    return {"user_alert_id": user_alert.id}
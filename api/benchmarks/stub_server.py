@@ -0,0 +1,93 @@
+"""
+Local stand-in for the upstream APIs.
+
+Serves recorded responses from the fixtures directory so benchmarks run
+offline and are not skewed by third-party latency or quotas. Point the app
+at it with settings.UPSTREAM_OVERRIDES = server.overrides.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+# (path prefix, fixture file, content type)
+ROUTES = [
+    ("/met/", "met_locationforecast.xml", "application/xml"),
+    ("/geocodify/v2/geocode", "geocodify_geocode.json", "application/json"),
+    ("/geocodify/v2/reverse", "geocodify_reverse.json", "application/json"),
+    ("/geocodify/v2/suggest", "geocodify_suggest.json", "application/json"),
+    ("/ors/v2/directions/", "ors_directions.json", "application/json"),
+]
+
+# Upstream base URL -> stub path prefix
+UPSTREAMS = {
+    "http://openaccess.pf.api.met.ie": "/met",
+    "https://api.geocodify.com": "/geocodify",
+    "https://api.openrouteservice.org": "/ors",
+}
+
+
+class StubUpstreamServer:
+    """
+    Threaded HTTP server replaying fixtures. `latency` (seconds) is added
+    to every response to approximate a real upstream round trip.
+    Usable as a context manager.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.latency = latency
+        self.request_counts = {}
+        self._fixtures = {prefix: ((FIXTURES_DIR / name).read_bytes(), content_type)
+                          for prefix, name, content_type in ROUTES}
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def overrides(self):
+        return {upstream: self.base_url + prefix for upstream, prefix in UPSTREAMS.items()}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                for prefix, (body, content_type) in stub._fixtures.items():
+                    if self.path.startswith(prefix):
+                        stub.request_counts[prefix] = stub.request_counts.get(prefix, 0) + 1
+                        if stub.latency:
+                            time.sleep(stub.latency)
+                        self.send_response(200)
+                        self.send_header("Content-Type", content_type)
+                        self.send_header("Content-Length", str(len(body)))
+                        self.end_headers()
+                        self.wfile.write(body)
+                        return
+                self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,143 @@
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from api.benchmarks.environment import seeded_environment
+from api.benchmarks.scenarios import SCENARIOS, UNMEASURED, issue, reset_caches
+from api.benchmarks.stats import percentile
+from api.urls import urlpatterns
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks every API route in cold- and warm-cache states against a seeded "
+        "throwaway database and a local stub of the upstream APIs"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Timed requests per route and state')
+        parser.add_argument('--allocation-iterations', type=int, default=5,
+                            help='Requests per route and state traced with tracemalloc')
+        parser.add_argument('--trails', type=int, default=500, help='Number of synthetic trails to seed')
+        parser.add_argument('--states', default='cold,warm', help='Comma separated cache states to measure')
+        parser.add_argument('--routes', help='Only benchmark routes containing this text')
+        parser.add_argument('--upstream-latency-ms', type=float, default=0,
+                            help='Artificial latency added by the upstream stub')
+        parser.add_argument('--json', dest='json_path', help='Write results to this file')
+        parser.add_argument('--baseline', help='Results file from a previous run to compare against')
+        parser.add_argument('--max-regression', type=float, default=0.25,
+                            help='Fail if a p95 is this fraction slower than the baseline')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse and keep the benchmark database')
+
+    def handle(self, *args, **options):
+        states = [state.strip() for state in options['states'].split(',') if state.strip()]
+        if not set(states) <= {'cold', 'warm'}:
+            raise CommandError("--states accepts cold and/or warm")
+        if options['iterations'] < 1 or options['allocation_iterations'] < 0:
+            raise CommandError("--iterations must be at least 1 and --allocation-iterations at least 0")
+
+        latency = options['upstream_latency_ms'] / 1000
+        with seeded_environment(options['trails'], options['keepdb'], latency, self.stdout.write) as (context, stub):
+            results = self.run_scenarios(context, states, options)
+            self.stdout.write(f"Upstream stub requests: {stub.request_counts}")
+
+        self.report(results)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['json_path']}")
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['max_regression'])
+
+    def run_scenarios(self, context, states, options):
+        client = Client()
+        results = {}
+        for pattern in urlpatterns:
+            route = str(pattern.pattern)
+            if options['routes'] and options['routes'] not in route or route in UNMEASURED:
+                continue
+            scenario = SCENARIOS.get(route)
+            if scenario is None:
+                self.stdout.write(self.style.WARNING(f"No benchmark scenario for route {route}"))
+                continue
+            request = scenario(context)
+            for state in states:
+                key = f"{request['method']} {route} [{state}]"
+                self.stdout.write(f"Benchmarking {key}...")
+                results[key] = self.measure(client, request, state, options)
+        return results
+
+    def measure(self, client, request, state, options):
+        if state == 'warm':
+            reset_caches()
+            issue(client, request)
+
+        timings = []
+        errors = 0
+        for _ in range(options['iterations']):
+            if state == 'cold':
+                reset_caches()
+            start = time.perf_counter()
+            response = issue(client, request)
+            timings.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+        peaks = []
+        retained = []
+        tracemalloc.start()
+        try:
+            for _ in range(options['allocation_iterations']):
+                if state == 'cold':
+                    reset_caches()
+                before, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                issue(client, request)
+                after, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+                retained.append(after - before)
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'requests': len(timings),
+            'errors': errors,
+            'p50_ms': percentile(timings, 50) * 1000,
+            'p95_ms': percentile(timings, 95) * 1000,
+            'p99_ms': percentile(timings, 99) * 1000,
+            'throughput_rps': len(timings) / sum(timings),
+            'peak_alloc_kib': max(peaks) / 1024 if peaks else None,
+            'retained_kib': sum(retained) / len(retained) / 1024 if retained else None,
+        }
+
+    def report(self, results):
+        header = f"{'route':<60} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'peak KiB':>9} {'errors':>6}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for key, r in results.items():
+            self.stdout.write(
+                f"{key:<60} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+                f"{r['throughput_rps']:>9.1f} {r['peak_alloc_kib'] or 0:>9.1f} {r['errors']:>6}"
+            )
+
+    def compare(self, results, baseline_path, max_regression):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+        regressions = []
+        for key, r in results.items():
+            if key not in baseline:
+                continue
+            before = baseline[key]['p95_ms']
+            change = (r['p95_ms'] - before) / before if before else 0
+            self.stdout.write(f"{key:<60} p95 {before:>9.2f} -> {r['p95_ms']:>9.2f} ms ({change:+.0%})")
+            if change > max_regression:
+                regressions.append(key)
+
+        if regressions:
+            raise CommandError(f"p95 regressed by more than {max_regression:.0%}: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
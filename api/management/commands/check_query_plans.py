@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from api.benchmarks.environment import seeded_environment
+from api.benchmarks.query_plans import (
+    MAX_ROW_FRACTION,
+    MIN_ROW_BUDGET,
+    check_plan,
+    explain,
+    route_queries,
+    routes,
+    table_rows,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs every API route against a seeded throwaway database, EXPLAINs each query it issues and "
+        "fails if a watched table is read by a sequential scan or an unbounded number of rows. "
+        "The same checks run in the test suite (QueryPlanTests); this command adds larger seeds and plan output."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trails', type=int, default=1000, help='Number of synthetic trails to seed')
+        parser.add_argument('--routes', help='Only check routes containing this text')
+        parser.add_argument('--max-row-fraction', type=float, default=MAX_ROW_FRACTION,
+                            help='Fail if a scan is estimated to return more than this fraction of its table')
+        parser.add_argument('--min-row-budget', type=int, default=MIN_ROW_BUDGET,
+                            help='Estimates up to this many rows always pass, for tiny tables')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the plan of every query')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse and keep the seeded database')
+
+    def handle(self, *args, **options):
+        with seeded_environment(options['trails'], options['keepdb'], log=self.stdout.write) as (context, _):
+            problems = self.check_routes(context, table_rows(), options)
+
+        if problems:
+            for problem in problems:
+                self.stdout.write(self.style.ERROR(problem))
+            raise CommandError(f"{len(problems)} query plan problems found")
+        self.stdout.write(self.style.SUCCESS("All queries use indexes on watched tables."))
+
+    def check_routes(self, context, rows_by_table, options):
+        client = Client()
+        problems = []
+        for route, scenario in routes():
+            if options['routes'] and options['routes'] not in route:
+                continue
+            if scenario is None:
+                self.stdout.write(self.style.WARNING(f"No scenario for route {route}, its queries are not checked"))
+                continue
+
+            queries = route_queries(client, scenario, context)
+            self.stdout.write(f"Checking {len(queries)} queries for {route}...")
+            for sql in queries:
+                plan = explain(sql)
+                if options['verbose_plans']:
+                    self.stdout.write(f"{sql}\n{json.dumps(plan, indent=2)}")
+                for problem in check_plan(route, plan, rows_by_table,
+                                          options['max_row_fraction'], options['min_row_budget']):
+                    problems.append(f"{route}: {problem}\n    {sql[:300]}")
+        return problems
@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.contrib.gis.geos import Point
 from api.models import WeatherAlert
+from api.utils.alert_impacts import rebuild_alert_impacts
 from django.utils import timezone
 from datetime import timedelta
 
@@ -35,4 +36,7 @@ class Command(BaseCommand):
         
         
         self.stdout.write(f'Alert location: {durrow_alert.location.x}, {durrow_alert.location.y}')
-        self.stdout.write(f'Alert radius: {durrow_alert.radius_km} km') 
\ No newline at end of file
+        self.stdout.write(f'Alert radius: {durrow_alert.radius_km} km') 
+
+        impacts = rebuild_alert_impacts()
+        self.stdout.write(f'Trail impact index rebuilt: {impacts} affected trail/alert pairs')
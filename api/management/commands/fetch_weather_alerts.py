@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.contrib.gis.geos import Point
 from api.models import WeatherAlert
+from api.utils.alert_impacts import rebuild_alert_impacts
 import requests
 from datetime import datetime
 import xml.etree.ElementTree as ET
@@ -10,6 +11,11 @@ class Command(BaseCommand):
     help = 'Fetches weather alerts from Met Éireann API'
 
     def handle(self, *args, **options):
+        self.fetch_alerts()
+        impacts = rebuild_alert_impacts()
+        self.stdout.write(self.style.SUCCESS(f'Trail impact index rebuilt: {impacts} affected trail/alert pairs'))
+
+    def fetch_alerts(self):
         # Met Éireann's actual warnings feed
         api_url = "https://www.met.ie/Open_Data/xml/xWarningPage.xml"
         
@@ -83,6 +83,7 @@ class Command(BaseCommand):
                     "management_organisation": properties.get("ManagementOrganisation"),
                     "location": geom if isinstance(geom, Point) else None,
                     "route": geom if isinstance(geom, LineString) else None,
+                    **Trail.simplified_routes(geom if isinstance(geom, LineString) else None),
                 }
             )
 
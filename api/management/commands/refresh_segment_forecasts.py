@@ -0,0 +1,142 @@
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api.models import SegmentForecast, TrailSegment
+from api.utils import rate_limit
+from api.utils.api_cache import APICache
+from api.views.get_top_trails_weather_segments import forecast_from_times, forecast_url, parse_forecast_times
+from api.views.route_weather import grid_cell
+
+
+class Command(BaseCommand):
+    help = (
+        "Precomputes the forecast at every trail segment for each hour of the forecast horizon. "
+        "Run it periodically; it only rebuilds when Met Éireann has published a new model run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon-hours', type=int, default=72, help='Hours of start times to precompute')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent forecast downloads')
+        parser.add_argument('--force', action='store_true', help='Rebuild even if the model run is unchanged')
+
+    def handle(self, *args, **options):
+        segments = list(TrailSegment.objects.only("id", "trail_id", "segment_point").order_by("trail_id", "segment_index"))
+        if not segments:
+            self.stdout.write("No trail segments, nothing to do.")
+            return
+
+        # Nearby segments share one forecast, fetched once for their grid cell
+        by_cell = {}
+        for segment in segments:
+            by_cell.setdefault(grid_cell(segment.segment_point.x, segment.segment_point.y), []).append(segment)
+        cells = list(by_cell)
+
+        first_run, first_times = self.fetch_forecast(cells[0])
+        if first_run is None:
+            self.stdout.write(self.style.ERROR("Could not fetch the forecast, aborting."))
+            return
+        latest_run = SegmentForecast.objects.aggregate(latest=Max("model_run"))["latest"]
+        if latest_run == first_run and not options['force']:
+            self.stdout.write(self.style.SUCCESS(f"Forecasts already up to date for model run {first_run}."))
+            return
+
+        now = timezone.now().astimezone(dt_timezone.utc)
+        start_hour = now.replace(minute=0, second=0, microsecond=0)
+        hours = [start_hour + timedelta(hours=h) for h in range(options['horizon_hours'])]
+
+        self.stdout.write(
+            f"Refreshing {len(segments)} segments in {len(cells)} forecast cells for model run {first_run}..."
+        )
+        # Each cell's forecast is reduced to its hourly values in the worker,
+        # so the parsed documents don't pile up while the rest download
+        hourly = {cells[0]: (first_run, self.hourly_forecasts(first_times, hours))}
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {cell: pool.submit(self.fetch_cell, cell, hours) for cell in cells[1:]}
+            for cell, future in futures.items():
+                hourly[cell] = future.result()
+
+        by_trail = {}
+        for segment in segments:
+            by_trail.setdefault(segment.trail_id, []).append(segment)
+        cell_of = {segment.pk: cell for cell, cell_segments in by_cell.items() for segment in cell_segments}
+
+        failed = sum(len(by_cell[cell]) for cell, (model_run, _) in hourly.items() if model_run is None)
+        for trail_id, trail_segments in by_trail.items():
+            rows = []
+            for segment in trail_segments:
+                model_run, forecasts = hourly[cell_of[segment.pk]]
+                if model_run is not None:
+                    rows.extend(self.build_rows(segment, model_run, forecasts, hours))
+
+            # Swap a trail's rows at once so readers never see a half-built trail
+            with transaction.atomic():
+                SegmentForecast.objects.filter(segment__trail_id=trail_id).delete()
+                SegmentForecast.objects.bulk_create(rows, batch_size=2000)
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} segments could not be fetched; they fall back to live lookups."))
+        self.stdout.write(self.style.SUCCESS("Segment forecasts refreshed."))
+
+    def fetch_forecast(self, cell):
+        """Returns (model run, forecast times) for a grid cell, or (None, None)."""
+        # Runs in pool threads, which don't inherit the caller's context
+        try:
+            with rate_limit.priority(rate_limit.BACKGROUND):
+                data = APICache.fetch(forecast_url(*cell))
+        except rate_limit.UpstreamShed:
+            return None, None
+        if not data:
+            return None, None
+        try:
+            root = ET.fromstring(data)
+        except ET.ParseError:
+            return None, None
+
+        model = root.find(".//model")
+        model_run = parse_datetime(model.get("termin")) if model is not None and model.get("termin") else None
+        if model_run is None:
+            model_run = timezone.now().replace(minute=0, second=0, microsecond=0)
+        return model_run, parse_forecast_times(root)
+
+    def fetch_cell(self, cell, hours):
+        """
+        (model run, hourly forecasts) for a cell, in a pool thread. The rate
+        limit check opens a database connection in the thread; close it here.
+        """
+        try:
+            model_run, forecast_times = self.fetch_forecast(cell)
+            if model_run is None:
+                return None, None
+            return model_run, self.hourly_forecasts(forecast_times, hours)
+        finally:
+            connection.close()
+
+    def hourly_forecasts(self, forecast_times, hours):
+        # Forecast times are naive UTC, as in fetch_weather_at()
+        return [forecast_from_times(forecast_times, hour.replace(tzinfo=None)) for hour in hours]
+
+    def build_rows(self, segment, model_run, forecasts, hours):
+        rows = []
+        for hour, forecast in zip(hours, forecasts):
+            if forecast is None:
+                continue
+            valid_time = parse_datetime(forecast["forecast_time"])
+            rows.append(SegmentForecast(
+                segment=segment,
+                target_time=hour,
+                valid_time=valid_time,
+                model_run=model_run,
+                temperature=forecast["temperature"],
+                cloudiness=forecast["cloudiness"],
+                wind_speed=forecast["wind_speed"],
+                wind_direction=forecast["wind_direction"],
+                rain=forecast["rain"],
+            ))
+        return rows
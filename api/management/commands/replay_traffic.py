@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks.stats import percentile
+from api.middleware import TrafficCaptureMiddleware
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays a traffic capture written by TrafficCaptureMiddleware against a running instance, "
+        "at the recorded pacing or a fixed rate, and reports latency and error rates per route"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', help='JSONL capture to replay')
+        parser.add_argument('--base-url', default='http://localhost:9000', help='Instance to send the requests to')
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help='Multiplier applied to the recorded pacing (2 replays twice as fast)')
+        parser.add_argument('--rate', type=float, help='Send at this fixed number of requests per second instead')
+        parser.add_argument('--concurrency', type=int, default=8, help='Maximum requests in flight')
+        parser.add_argument('--limit', type=int, help='Only replay the first N requests')
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+        parser.add_argument('--json', dest='json_path', help='Write results to this file')
+
+    def handle(self, *args, **options):
+        records = self.read_log(options['log'], options['limit'])
+        if not records:
+            raise CommandError(f"No requests in {options['log']}")
+        if options['rate'] is not None and options['rate'] <= 0 or options['speed'] <= 0:
+            raise CommandError("--rate and --speed must be positive")
+
+        offsets = self.schedule(records, options['rate'], options['speed'])
+        self.stdout.write(
+            f"Replaying {len(records)} requests over {offsets[-1]:.0f}s "
+            f"against {options['base_url']} with concurrency {options['concurrency']}..."
+        )
+
+        base_url = options['base_url'].rstrip('/')
+        sessions = threading.local()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            futures = []
+            for record, offset in zip(records, offsets):
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append((record, pool.submit(self.send, sessions, base_url, record,
+                                                    options['timeout'], start + offset)))
+            outcomes = [(record, future.result()) for record, future in futures]
+        elapsed = time.perf_counter() - start
+
+        results = self.summarize(outcomes)
+        self.report(results, len(outcomes), elapsed)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['json_path']}")
+
+    def read_log(self, path, limit):
+        records = []
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+                if limit and len(records) >= limit:
+                    break
+        return records
+
+    def schedule(self, records, rate, speed):
+        """Seconds from the start of the replay at which each request is sent."""
+        if rate:
+            return [i / rate for i in range(len(records))]
+        times = [datetime.fromisoformat(record['time']) for record in records]
+        return [(t - times[0]).total_seconds() / speed for t in times]
+
+    def send(self, sessions, base_url, record, timeout, scheduled):
+        """Returns (status or None on a connection error, seconds taken, seconds sent late)."""
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        sent = time.perf_counter()
+        try:
+            response = sessions.session.request(
+                record['method'], base_url + record['path'],
+                params=record.get('params'),
+                json=record.get('body'),
+                headers={TrafficCaptureMiddleware.REPLAY_HEADER: '1'},
+                timeout=timeout,
+            )
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+        return status, time.perf_counter() - sent, max(0.0, sent - scheduled)
+
+    def summarize(self, outcomes):
+        by_route = {}
+        for record, outcome in outcomes:
+            key = f"{record['method']} {record.get('route') or record['path']}"
+            by_route.setdefault(key, []).append(outcome)
+
+        results = {}
+        for key, route_outcomes in sorted(by_route.items()):
+            # Connection errors are counted as errors, not timed
+            timings = sorted(seconds for status, seconds, _ in route_outcomes if status is not None)
+            errors = sum(1 for status, _, _ in route_outcomes if status is None or status >= 500)
+            client_errors = sum(1 for status, _, _ in route_outcomes if status is not None and 400 <= status < 500)
+            results[key] = {
+                'requests': len(route_outcomes),
+                'error_rate': errors / len(route_outcomes),
+                'client_error_rate': client_errors / len(route_outcomes),
+                'p50_ms': percentile(timings, 50) * 1000 if timings else None,
+                'p95_ms': percentile(timings, 95) * 1000 if timings else None,
+                'p99_ms': percentile(timings, 99) * 1000 if timings else None,
+                'max_lag_ms': max(lag for _, _, lag in route_outcomes) * 1000,
+            }
+        return results
+
+    def report(self, results, total, elapsed):
+        header = (f"{'route':<60} {'reqs':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+                  f"{'5xx':>6} {'4xx':>6} {'lag ms':>8}")
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for key, r in results.items():
+            p50, p95, p99 = (f"{r[name]:.2f}" if r[name] is not None else "-" for name in ('p50_ms', 'p95_ms', 'p99_ms'))
+            self.stdout.write(
+                f"{key:<60} {r['requests']:>6} {p50:>9} {p95:>9} {p99:>9} "
+                f"{r['error_rate']:>6.1%} {r['client_error_rate']:>6.1%} {r['max_lag_ms']:>8.0f}"
+            )
+        self.stdout.write(f"{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+        if any(r['max_lag_ms'] > 1000 for r in results.values()):
+            self.stdout.write(self.style.WARNING(
+                "Requests were sent more than 1s late: raise --concurrency or the instance is saturated."
+            ))
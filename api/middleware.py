@@ -0,0 +1,159 @@
+import json
+import random
+import threading
+from datetime import datetime, timezone
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import JsonResponse
+
+from .utils import memory_profile, metrics, request_memo
+from .utils.rate_limit import UpstreamShed
+
+
+def time_query(execute, sql, params, many, context):
+    with metrics.timed("db"):
+        return execute(sql, params, many, context)
+
+
+class TimingMiddleware:
+    """
+    Times every request, breaking it down into the phases recorded with
+    metrics.timed() (database queries are timed automatically). The
+    breakdown is returned in a Server-Timing header and the totals feed the
+    /metrics endpoint.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = metrics.start_request()
+        start = perf_counter()
+        try:
+            with connection.execute_wrapper(time_query):
+                response = self.get_response(request)
+        finally:
+            timings = metrics.end_request(token)
+        total = perf_counter() - start
+
+        route = request.resolver_match.route if request.resolver_match else "unmatched"
+        metrics.inc("api_requests_total", route=route, method=request.method, status=response.status_code)
+        metrics.observe("api_request_duration_seconds", total, route=route)
+        response["Server-Timing"] = metrics.server_timing_header(timings, total)
+        return response
+
+
+class RequestMemoMiddleware:
+    """
+    Scopes a request_memo to each request so repeated upstream lookups and
+    decoded payloads are reused within the request and dropped after it.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request_memo.start()
+        try:
+            return self.get_response(request)
+        finally:
+            request_memo.end(token)
+
+
+class UpstreamShedMiddleware:
+    """
+    Answers a view that needed an upstream call shed by the rate limiter
+    with 503 Service Unavailable and a Retry-After header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, UpstreamShed):
+            return None
+        response = JsonResponse({"error": "The upstream service is busy, try again shortly"}, status=503)
+        response["Retry-After"] = str(max(1, exception.retry_after))
+        return response
+
+
+class TrafficCaptureMiddleware:
+    """
+    Appends a sample of API requests to settings.TRAFFIC_CAPTURE_PATH as
+    JSON lines (method, path, query, JSON body, status, timing and cache
+    outcomes) for the replay_traffic command. Disabled unless the path is
+    set. Requests sent by replay_traffic itself are not captured.
+    """
+    MAX_BODY_BYTES = 64 * 1024
+    REPLAY_HEADER = "X-Traffic-Replay"
+
+    def __init__(self, get_response):
+        self.path = getattr(settings, "TRAFFIC_CAPTURE_PATH", None)
+        if not self.path:
+            raise MiddlewareNotUsed
+        self.sample_rate = getattr(settings, "TRAFFIC_CAPTURE_SAMPLE_RATE", 0.01)
+        self.get_response = get_response
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        if (not request.path.startswith("/api/") or self.REPLAY_HEADER in request.headers
+                or random.random() >= self.sample_rate):
+            return self.get_response(request)
+
+        body = None
+        if request.content_type == "application/json" and len(request.body) <= self.MAX_BODY_BYTES:
+            try:
+                body = json.loads(request.body)
+            except ValueError:
+                pass
+
+        start = perf_counter()
+        response = self.get_response(request)
+        record = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "method": request.method,
+            "path": request.path,
+            "route": request.resolver_match.route if request.resolver_match else None,
+            "params": {key: values if len(values) > 1 else values[0] for key, values in request.GET.lists()},
+            "body": body,
+            "status": response.status_code,
+            "duration_ms": round((perf_counter() - start) * 1000, 2),
+            "cache": metrics.request_cache_outcomes(),
+        }
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        # One unbuffered O_APPEND write per line keeps lines whole across workers
+        with self.lock, open(self.path, "ab", buffering=0) as f:
+            f.write(line.encode())
+        return response
+
+
+class MemoryProfileMiddleware:
+    """
+    Traces a settings.MEMORY_PROFILE_SAMPLE_RATE fraction of requests with
+    tracemalloc and adds them to their route's allocation profile (see
+    api/utils/memory_profile.py). Disabled unless the rate is set.
+    """
+
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, "MEMORY_PROFILE_SAMPLE_RATE", 0)
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+        self.frames = getattr(settings, "MEMORY_PROFILE_FRAMES", 5)
+        self.top_sites = getattr(settings, "MEMORY_PROFILE_TOP_SITES", 10)
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        response, peak, retained, snapshot = memory_profile.trace(lambda: self.get_response(request), self.frames)
+        if snapshot is not None:
+            route = request.resolver_match.route if request.resolver_match else "unmatched"
+            memory_profile.record(route, peak, retained, snapshot, self.top_sites)
+        return response
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-19 09:12
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_merge_20250322_2215'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('FORWARD', 'Address to coordinates'), ('REVERSE', 'Coordinates to address')], max_length=7)),
+                ('query_key', models.CharField(max_length=1000)),
+                ('label', models.CharField(max_length=1000)),
+                ('location', django.contrib.gis.db.models.fields.PointField(geography=True, srid=4326)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'query_key'), name='unique_geocode_query')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:03
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_geocodeentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trail',
+            name='route_low',
+            field=django.contrib.gis.db.models.fields.LineStringField(blank=True, geography=True, null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='trail',
+            name='route_medium',
+            field=django.contrib.gis.db.models.fields.LineStringField(blank=True, geography=True, null=True, srid=4326),
+        ),
+        # Backfill existing trails, same tolerances as Trail.SIMPLIFIED_ROUTES
+        migrations.RunSQL(
+            sql="""
+                UPDATE api_trail SET
+                    route_medium = ST_SimplifyPreserveTopology(route::geometry, 0.0001)::geography,
+                    route_low = ST_SimplifyPreserveTopology(route::geometry, 0.001)::geography;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
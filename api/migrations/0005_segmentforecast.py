@@ -0,0 +1,32 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_trail_route_low_trail_route_medium'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SegmentForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_time', models.DateTimeField()),
+                ('valid_time', models.DateTimeField()),
+                ('model_run', models.DateTimeField()),
+                ('temperature', models.FloatField(blank=True, null=True)),
+                ('cloudiness', models.IntegerField(blank=True, null=True)),
+                ('wind_speed', models.IntegerField(blank=True, null=True)),
+                ('wind_direction', models.CharField(blank=True, max_length=10, null=True)),
+                ('rain', models.FloatField(default=0.0)),
+                ('segment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecasts', to='api.trailsegment')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('segment', 'target_time'), name='unique_segment_forecast_time')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-19 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_segmentforecast'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trail',
+            index=models.Index(fields=['activity', 'id'], name='trail_activity_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trail',
+            index=models.Index(fields=['county', 'id'], name='trail_county_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trail',
+            index=models.Index(fields=['difficulty', 'id'], name='trail_difficulty_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trail',
+            index=models.Index(fields=['length_km'], name='trail_length_km_idx'),
+        ),
+    ]
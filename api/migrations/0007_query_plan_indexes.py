@@ -0,0 +1,21 @@
+# Generated by Django 5.1.5 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_trail_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trailsegment',
+            index=models.Index(fields=['trail', 'segment_index'], name='segment_trail_index_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weatheralert',
+            index=models.Index(fields=['is_active'], name='weatheralert_is_active_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.5 on 2026-10-19 17:30
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Keep in sync with the comment on Trail.search_vector
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+    setweight(to_tsvector('english', concat_ws(' ', NEW.county, NEW.nearest_town_start, NEW.nearest_town_finish)), 'B') ||
+    setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C')
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_upstreambudget'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='trail',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            sql=f"""
+                CREATE FUNCTION api_trail_search_vector() RETURNS trigger AS $$
+                BEGIN
+                    NEW.search_vector := {SEARCH_VECTOR_SQL};
+                    RETURN NEW;
+                END
+                $$ LANGUAGE plpgsql;
+
+                CREATE TRIGGER api_trail_search_vector
+                    BEFORE INSERT OR UPDATE OF name, county, nearest_town_start, nearest_town_finish, description
+                    ON api_trail FOR EACH ROW EXECUTE FUNCTION api_trail_search_vector();
+
+                -- Backfill: fires the trigger for every existing trail
+                UPDATE api_trail SET name = name;
+            """,
+            reverse_sql="""
+                DROP TRIGGER IF EXISTS api_trail_search_vector ON api_trail;
+                DROP FUNCTION IF EXISTS api_trail_search_vector();
+            """,
+        ),
+        migrations.AddIndex(
+            model_name='trail',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='trail_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trail',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='trail_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
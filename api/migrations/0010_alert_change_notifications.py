@@ -0,0 +1,46 @@
+# Generated by Django 5.1.5 on 2026-10-19 18:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_trail_search'),
+    ]
+
+    operations = [
+        # Channel name matches api.utils.alert_changes.ALERT_CHANNEL
+        migrations.RunSQL(
+            sql="""
+                CREATE FUNCTION api_notify_alert_change() RETURNS trigger AS $$
+                DECLARE
+                    row_id bigint;
+                BEGIN
+                    IF TG_OP = 'DELETE' THEN
+                        row_id := OLD.id;
+                    ELSE
+                        row_id := NEW.id;
+                    END IF;
+                    PERFORM pg_notify('alert_changes', json_build_object(
+                        'table', TG_TABLE_NAME, 'op', TG_OP, 'id', row_id
+                    )::text);
+                    RETURN NULL;
+                END
+                $$ LANGUAGE plpgsql;
+
+                CREATE TRIGGER api_weatheralert_notify
+                    AFTER INSERT OR UPDATE OR DELETE ON api_weatheralert
+                    FOR EACH ROW EXECUTE FUNCTION api_notify_alert_change();
+
+                CREATE TRIGGER api_userweatheralert_notify
+                    AFTER INSERT OR UPDATE OR DELETE ON api_userweatheralert
+                    FOR EACH ROW EXECUTE FUNCTION api_notify_alert_change();
+            """,
+            reverse_sql="""
+                DROP TRIGGER IF EXISTS api_weatheralert_notify ON api_weatheralert;
+                DROP TRIGGER IF EXISTS api_userweatheralert_notify ON api_userweatheralert;
+                DROP FUNCTION IF EXISTS api_notify_alert_change();
+            """,
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.5 on 2026-10-19 18:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_alert_change_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrailAlertImpact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_m', models.FloatField()),
+                ('alert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='impacts', to='api.weatheralert')),
+                ('trail', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_impacts', to='api.trail')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('alert', 'trail'), name='unique_trail_alert_impact')],
+            },
+        ),
+    ]
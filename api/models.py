@@ -3,6 +3,9 @@ from django.contrib.gis.db import models as gis_models
 
 
 from django.contrib.gis.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
 
 class Trail(models.Model):
     object_id = models.IntegerField(unique=True)
@@ -24,10 +27,45 @@ class Trail(models.Model):
     management_organisation = models.CharField(max_length=1000, null=True, blank=True)
     location = models.PointField(geography=True, null=True, blank=True)
     route = models.LineStringField(geography=True)
+    # Simplified copies of route for lower level-of-detail responses
+    route_medium = models.LineStringField(geography=True, null=True, blank=True)
+    route_low = models.LineStringField(geography=True, null=True, blank=True)
+    # Weighted name (A), places (B) and description (C) lexemes, kept up to
+    # date by the api_trail_search_vector trigger (migration 0009)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Simplification tolerance (degrees) for each simplified route field
+    SIMPLIFIED_ROUTES = {
+        'route_medium': 0.0001,  # ~10 m
+        'route_low': 0.001,  # ~100 m
+    }
+
+    class Meta:
+        # Filter columns of the trail listing, each paired with id so a
+        # filtered page is read in keyset order straight from the index.
+        # route and location already get GiST indexes from spatial_index.
+        indexes = [
+            models.Index(fields=['activity', 'id'], name='trail_activity_id_idx'),
+            models.Index(fields=['county', 'id'], name='trail_county_id_idx'),
+            models.Index(fields=['difficulty', 'id'], name='trail_difficulty_id_idx'),
+            models.Index(fields=['length_km'], name='trail_length_km_idx'),
+            GinIndex(fields=['search_vector'], name='trail_search_vector_idx'),
+            GinIndex(fields=['name'], name='trail_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
 
     def __str__(self):
         return self.name or f"Trail {self.object_id}"
 
+    @classmethod
+    def simplified_routes(cls, route):
+        """Returns {field: simplified LineString} for each SIMPLIFIED_ROUTES field."""
+        if route is None:
+            return {field: None for field in cls.SIMPLIFIED_ROUTES}
+        return {
+            field: route.simplify(tolerance, preserve_topology=True)
+            for field, tolerance in cls.SIMPLIFIED_ROUTES.items()
+        }
+
 
 class TrailSegment(models.Model):
     trail = models.ForeignKey(Trail, on_delete=models.CASCADE, related_name='segments')
@@ -38,10 +76,40 @@ class TrailSegment(models.Model):
     segment_point = models.PointField(geography=True)
     segment_line = models.LineStringField(geography=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['trail', 'segment_index'], name='segment_trail_index_idx'),
+        ]
+
     def __str__(self):
         return f"{self.trail} - Segment {self.segment_index}"
 
 
+class SegmentForecast(models.Model):
+    """
+    Forecast at a segment's point for the hour a hiker would reach it.
+    One row per segment per hour of the forecast horizon, rebuilt by the
+    refresh_segment_forecasts command for each new forecast model run.
+    """
+    segment = models.ForeignKey(TrailSegment, on_delete=models.CASCADE, related_name='forecasts')
+    target_time = models.DateTimeField()  # Hour the segment is reached
+    valid_time = models.DateTimeField()  # "from" time of the forecast entry used
+    model_run = models.DateTimeField()
+    temperature = models.FloatField(null=True, blank=True)
+    cloudiness = models.IntegerField(null=True, blank=True)
+    wind_speed = models.IntegerField(null=True, blank=True)
+    wind_direction = models.CharField(max_length=10, null=True, blank=True)
+    rain = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['segment', 'target_time'], name='unique_segment_forecast_time'),
+        ]
+
+    def __str__(self):
+        return f"{self.segment} @ {self.target_time:%Y-%m-%d %H:%M}"
+
+
 class WeatherAlert(models.Model):
     SEVERITY_CHOICES = [
         ('LOW', 'Low'),
@@ -60,6 +128,29 @@ class WeatherAlert(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active'], name='weatheralert_is_active_idx'),
+        ]
+
+class TrailAlertImpact(models.Model):
+    """
+    A trail within an alert's radius, with its distance from the alert
+    centre. Rebuilt in one spatial join by api.utils.alert_impacts whenever
+    fetch_weather_alerts runs.
+    """
+    alert = models.ForeignKey(WeatherAlert, on_delete=models.CASCADE, related_name='impacts')
+    trail = models.ForeignKey(Trail, on_delete=models.CASCADE, related_name='alert_impacts')
+    distance_m = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['alert', 'trail'], name='unique_trail_alert_impact'),
+        ]
+
+    def __str__(self):
+        return f"{self.alert.title} -> {self.trail}"
+
 class UserWeatherAlert(models.Model):
     CONDITION_CHOICES = [
         ('SUNNY', 'Sunny (Low cloudiness)'),
@@ -88,4 +179,45 @@ class UserWeatherAlert(models.Model):
             'LT': 'less than',
             'EQ': 'equal to'
         }
-        return f"{self.name}: Alert when {self.get_condition_display()} is {comparison_display[self.comparison]} {self.threshold}"
\ No newline at end of file
+        return f"{self.name}: Alert when {self.get_condition_display()} is {comparison_display[self.comparison]} {self.threshold}"
+
+class GeocodeEntry(models.Model):
+    """
+    Persistent geocoder results shared by every worker. Forward entries are
+    keyed on the normalized address text (hashed when too long for the
+    column), reverse entries on the rounded coordinates. Both carry the
+    resolved point; reverse lookups reuse the label of a nearby reverse
+    entry, never a forward one (see api.utils.geocode_store).
+    """
+    KIND_CHOICES = [
+        ('FORWARD', 'Address to coordinates'),
+        ('REVERSE', 'Coordinates to address'),
+    ]
+
+    kind = models.CharField(max_length=7, choices=KIND_CHOICES)
+    query_key = models.CharField(max_length=1000)
+    label = models.CharField(max_length=1000)
+    location = models.PointField(geography=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'query_key'], name='unique_geocode_query'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.query_key} -> {self.label}"
+
+
+class UpstreamBudget(models.Model):
+    """
+    Token bucket for one upstream provider, shared by every worker. Updated
+    in place by api.utils.rate_limit; tokens is the level at updated_at.
+    """
+    provider = models.CharField(max_length=100, unique=True)
+    tokens = models.FloatField()
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.provider}: {self.tokens:.1f} tokens"
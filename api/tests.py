@@ -1,3 +1,280 @@
-from django.test import TestCase
+import gzip
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+from datetime import date, datetime, timezone as dt_timezone
 
-# Create your tests here.
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from .benchmarks.environment import seeded_environment
+from .benchmarks.query_plans import check_plan, explain, route_queries, routes, table_rows
+from .benchmarks.stub_server import FIXTURES_DIR
+from .middleware import UpstreamShedMiddleware
+from .utils import cache_snapshot, rate_limit
+from .utils.http_cache import COMPRESS_MIN_BYTES, conditional_response
+from .utils.location_index import LocationIndex, edit_distance
+from .utils.solar import sun_times
+from .utils.trail_clusters import tiles_for_bbox
+from .views.best_start_times import DEFAULT_IDEAL_TEMPERATURE, DEFAULT_WEIGHTS, hourly_forecast, score_start_times
+from .views.get_top_trails_weather_segments import parse_forecast_times
+from .views.views import decode_polyline
+
+
+class QueryPlanTests(TestCase):
+    """
+    Every API route's queries must reach the large tables through indexes
+    (see api/benchmarks/query_plans.py). Runs the benchmark scenarios
+    against seeded synthetic trails with upstream calls served by the stub.
+    """
+    TRAIL_COUNT = 300
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Seeded inside the class transaction, so rolled back afterwards
+        environment = seeded_environment(cls.TRAIL_COUNT, log=lambda message: None, create_db=False)
+        cls.context, _ = cls.enterClassContext(environment)
+        cls.table_rows = table_rows()
+
+    def test_every_route_has_a_scenario(self):
+        missing = [route for route, scenario in routes() if scenario is None]
+        self.assertEqual(missing, [], "Add these routes to api/benchmarks/scenarios.py")
+
+    def test_queries_use_indexes(self):
+        client = Client()
+        for route, scenario in routes():
+            if scenario is None:
+                continue
+            with self.subTest(route=route):
+                problems = [
+                    f"{problem}\n    {sql[:300]}"
+                    for sql in route_queries(client, scenario, self.context)
+                    for problem in check_plan(route, explain(sql), self.table_rows)
+                ]
+                self.assertEqual(problems, [], f"Query plan problems for {route}")
+
+
+class ForecastParsingTests(SimpleTestCase):
+    """Reads the benchmark's recorded Met Éireann forecast."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        root = ET.parse(FIXTURES_DIR / "met_locationforecast.xml").getroot()
+        cls.forecast_times = parse_forecast_times(root)
+        cls.start = datetime(2026, 10, 19, tzinfo=dt_timezone.utc)
+
+    def test_period_precipitation_is_merged_into_instants(self):
+        hours = hourly_forecast(self.forecast_times, self.start, 72)
+        self.assertNotIn(None, hours)
+        rain = [rain for rain, _, _ in hours]
+        self.assertGreater(sum(1 for value in rain if value > 0), 1)
+        self.assertAlmostEqual(sum(rain), 25.1, places=1)
+
+    def test_rain_weight_changes_the_ranking(self):
+        hours = hourly_forecast(self.forecast_times, self.start, 72)
+        timelines = [(0, hours), (2, hours)]
+        weights = dict(DEFAULT_WEIGHTS, ideal_temperature=DEFAULT_IDEAL_TEMPERATURE)
+
+        def best_hour(weights):
+            scores = score_start_times(timelines, 48, weights)
+            return min(range(48), key=lambda hour: scores[hour])
+
+        self.assertNotEqual(best_hour(weights), best_hour(dict(weights, rain_weight=0.0)))
+
+
+class SolarTests(SimpleTestCase):
+    # Dublin, against the published times (timeanddate.com), in UTC
+    DUBLIN = (53.3498, -6.2603)
+    REFERENCE = [
+        (date(2024, 6, 21), datetime(2024, 6, 21, 3, 57, tzinfo=dt_timezone.utc),
+         datetime(2024, 6, 21, 20, 57, tzinfo=dt_timezone.utc)),
+        (date(2024, 12, 21), datetime(2024, 12, 21, 8, 38, tzinfo=dt_timezone.utc),
+         datetime(2024, 12, 21, 16, 8, tzinfo=dt_timezone.utc)),
+    ]
+
+    def test_sunrise_and_sunset_match_reference_times(self):
+        for day, sunrise, sunset in self.REFERENCE:
+            with self.subTest(day=day):
+                [(_, events)] = sun_times(*self.DUBLIN, day)
+                rise, set_ = events["sunrise"]
+                self.assertLess(abs((rise - sunrise).total_seconds()), 90)
+                self.assertLess(abs((set_ - sunset).total_seconds()), 90)
+
+    def test_invalid_locations_and_dates_are_rejected(self):
+        client = Client()
+        for query in ("lat=nan&lon=0", "lat=0&lon=inf", "lat=91&lon=0", "lat=0&lon=1e308",
+                      "lat=0&lon=0&date=9999-12-31&days=2", "lat=0&lon=0&date=0001-01-01"):
+            with self.subTest(query=query):
+                self.assertEqual(client.get(f"/api/solar/?{query}").status_code, 400)
+
+
+class LocationIndexTests(SimpleTestCase):
+    def test_edit_distance(self):
+        self.assertEqual(edit_distance("galway", "galway", 2), 0)
+        self.assertEqual(edit_distance("glendalough", "glendalogh", 2), 1)
+        # A transposition is one edit
+        self.assertEqual(edit_distance("galway", "glaway", 2), 1)
+        # Stops at limit + 1
+        self.assertEqual(edit_distance("kilkenny", "killarney", 1), 2)
+        self.assertEqual(edit_distance("cork", "corkscrew hill", 2), 3)
+
+    def test_suggest(self):
+        index = LocationIndex()
+        index.add("Glendalough, Co. Wicklow", 53.01, -6.33, name="Glendalough", weight=2)
+        index.add("Glenbeigh, Co. Kerry", 52.06, -9.94, name="Glenbeigh", weight=5)
+        index.add("Co. Galway", 53.27, -9.05, name="Galway")
+
+        # Prefix matches, heaviest first
+        self.assertEqual([s["value"] for s in index.suggest("Glen")],
+                         ["Glenbeigh, Co. Kerry", "Glendalough, Co. Wicklow"])
+        # Typos are corrected
+        [suggestion] = index.suggest("glendalogh")
+        self.assertEqual(suggestion["label"], "Glendalough, Co. Wicklow (Did you mean: Glendalough?)")
+        self.assertEqual(index.suggest("Dún"), [])
+        self.assertFalse(index.add("Glendalough", 0, 0))
+
+
+class HttpCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.calls = 0
+
+        @conditional_response(60)
+        def view(request):
+            self.calls += 1
+            return JsonResponse({"padding": "x" * int(request.GET.get("size", COMPRESS_MIN_BYTES))})
+        self.view = view
+
+    def test_repeat_requests_are_served_from_cache(self):
+        first = self.view(self.factory.get("/cached"))
+        second = self.view(self.factory.get("/cached"))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.view(self.factory.get("/cached"))["ETag"]
+        response = self.view(self.factory.get("/cached", HTTP_IF_NONE_MATCH=f"W/{etag}"))
+        self.assertEqual(response.status_code, 304)
+        response = self.view(self.factory.get("/cached", HTTP_IF_NONE_MATCH='"other"'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_gzip_negotiation(self):
+        plain = self.view(self.factory.get("/cached"))
+        for accept_encoding, compressed in (("gzip, deflate", True), ("*", True), ("gzip;q=0", False),
+                                            ("gzip;q=0, *", False), ("br", False), ("identity", False)):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.view(self.factory.get("/cached", HTTP_ACCEPT_ENCODING=accept_encoding))
+                self.assertEqual(response.get("Content-Encoding") == "gzip", compressed)
+                self.assertEqual(gzip.decompress(response.content) if compressed else response.content, plain.content)
+                self.assertNotEqual(response["ETag"] == plain["ETag"], compressed)
+                self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.view(self.factory.get("/cached", {"size": 10}, HTTP_ACCEPT_ENCODING="gzip"))
+        self.assertNotIn("Content-Encoding", response)
+
+
+class DecodePolylineTests(SimpleTestCase):
+    def test_reference_polyline(self):
+        # The example from Google's encoded polyline documentation
+        self.assertEqual(
+            decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@"),
+            [[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]],
+        )
+
+    def test_precision(self):
+        self.assertEqual(decode_polyline("_izlhA~rlgdF", precision=6), [[-120.2, 38.5]])
+        self.assertEqual(decode_polyline(""), [])
+
+
+@override_settings(UPSTREAM_RATE_LIMITS={"test_provider": {"rate": 0.01, "burst": 1}})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        # The bucket row is rolled back after each test
+        self.addCleanup(rate_limit._known_buckets.discard, "test_provider")
+
+    def test_exhausted_budget_is_shed(self):
+        rate_limit.acquire("test_provider")
+        with self.assertRaises(rate_limit.UpstreamShed) as shed:
+            rate_limit.acquire("test_provider")
+        self.assertEqual(shed.exception.provider, "test_provider")
+        # One token per 100 s
+        self.assertGreater(shed.exception.retry_after, 90)
+
+    @override_settings(
+        UPSTREAM_RATE_LIMITS={"test_provider": {"rate": 0.01, "burst": 2}},
+        UPSTREAM_MAX_WAIT_SECONDS={rate_limit.BACKGROUND: 0},
+    )
+    def test_background_calls_leave_the_reserve(self):
+        with rate_limit.priority(rate_limit.BACKGROUND):
+            rate_limit.acquire("test_provider")
+            with self.assertRaises(rate_limit.UpstreamShed):
+                rate_limit.acquire("test_provider")
+        # Interactive calls may take the last token
+        rate_limit.acquire("test_provider")
+
+    def test_unlimited_providers_are_never_shed(self):
+        for _ in range(5):
+            rate_limit.acquire("unlimited_provider")
+
+    def test_shed_views_answer_503(self):
+        middleware = UpstreamShedMiddleware(lambda request: None)
+        response = middleware.process_exception(RequestFactory().get("/"), rate_limit.UpstreamShed("test_provider", 7))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "7")
+        self.assertIsNone(middleware.process_exception(RequestFactory().get("/"), ValueError()))
+
+
+class CacheSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "snapshots", "cache_snapshot.bin")
+        cache.set("snapshot_test", {"value": 1}, 600)
+        self.assertEqual(cache_snapshot.save(self.path, 10 ** 6), 1)
+        cache.clear()
+
+    def test_signed_snapshot_is_loaded(self):
+        self.assertEqual(cache_snapshot.load(self.path, 3600), 1)
+        self.assertEqual(cache.get("snapshot_test"), {"value": 1})
+
+    def test_tampered_snapshot_is_rejected(self):
+        with open(self.path, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 1]))
+        self.assertEqual(cache_snapshot.load(self.path, 3600), 0)
+        self.assertIsNone(cache.get("snapshot_test"))
+
+    def test_snapshot_signed_with_another_key_is_rejected(self):
+        with override_settings(SECRET_KEY="another key"):
+            self.assertEqual(cache_snapshot.load(self.path, 3600), 0)
+
+    def test_old_snapshot_is_ignored(self):
+        self.assertEqual(cache_snapshot.load(self.path, -1), 0)
+
+    def test_writable_snapshot_is_rejected(self):
+        if not hasattr(os, "getuid"):
+            self.skipTest("POSIX permissions only")
+        os.chmod(self.path, 0o666)
+        self.assertEqual(cache_snapshot.load(self.path, 3600), 0)
+
+
+class TilesForBboxTests(SimpleTestCase):
+    IRELAND = (-10.5, 51.4, -5.4, 55.4)
+
+    def test_tiles_covering_ireland(self):
+        self.assertEqual(tiles_for_bbox(self.IRELAND, 6), [(30, 20), (30, 21), (31, 20), (31, 21)])
+        self.assertEqual(len(tiles_for_bbox(self.IRELAND, 9)), 88)
+
+    def test_whole_world(self):
+        self.assertEqual(tiles_for_bbox((-180, -90, 180, 90), 0), [(0, 0)])
+        self.assertEqual(tiles_for_bbox((-180, -90, 180, 90), 1), [(0, 0), (0, 1), (1, 0), (1, 1)])
@@ -4,9 +4,14 @@ from .views.views import (
     get_reverse_address,
     get_directions, 
     get_all_trails, 
+    get_trails,
+    get_trail_search,
+    get_trails_along_route,
+    get_trail_clusters,
     get_top_trails_near_location,
     get_top_cycle_trails_near_location,
     get_top_walking_trails_near_location,
+    get_top_trails_batch,
     get_location_suggestions
 )
 
@@ -14,9 +19,13 @@ from .views.weather import (
     get_weather, 
     get_weather_alerts, 
     get_solar, 
+    get_trail_alerts,
+    get_alert_affected_trails,
 )
 
 from .views.get_top_trails_weather_segments import get_top_trails_weather_segments
+from .views.best_start_times import get_best_start_times
+from .views.alert_stream import stream_alerts
 from .views.user_weather_alerts import user_weather_alerts, user_weather_alert_detail, check_user_alerts
 
 urlpatterns = [
@@ -24,15 +33,24 @@ urlpatterns = [
     path('address/', get_address), #cached
     path('reverse-address/', get_reverse_address), #cached
     path('directions/', get_directions), #cached
-    path('solar/', get_solar), #cached
+    path('solar/', get_solar),
     path('weather-alerts/', get_weather_alerts),
+    path('weather-alerts/trails/', get_alert_affected_trails), #cached
+    path('alerts/stream/', stream_alerts),  # ASGI only
     path('user-weather-alerts/', user_weather_alerts),
     path('user-weather-alerts/<int:alert_id>/', user_weather_alert_detail),
     path('user-weather-alerts/check/', check_user_alerts),
+    path('activities/trails/', get_trails), #cached
     path('activities/trails/all', get_all_trails), #cached
+    path('activities/trails/search/', get_trail_search), #cached
+    path('activities/trails/along-route/', get_trails_along_route), #cached
+    path('activities/trails/clusters/', get_trail_clusters), #cached per tile
     path('activities/trails/top/', get_top_trails_near_location), #cached
     path('activities/trails/top/cycles/', get_top_cycle_trails_near_location), #cached
     path('activities/trails/top/walks/', get_top_walking_trails_near_location), #cached
+    path('activities/trails/top/batch/', get_top_trails_batch),
     path('activities/trails/top/weather-segments/', get_top_trails_weather_segments),
+    path('activities/trails/best-start-times/', get_best_start_times),
+    path('activities/trails/<int:object_id>/alerts/', get_trail_alerts),
     path('location-suggestions/', get_location_suggestions), #cached
 ]
\ No newline at end of file
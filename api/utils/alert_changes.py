@@ -0,0 +1,76 @@
+"""
+Change notifications for WeatherAlert and UserWeatherAlert rows.
+
+A trigger on both tables (migration 0010) NOTIFYs ALERT_CHANNEL with
+{"table", "op", "id"} on every write, delivered when the writing
+transaction commits. Each ASGI worker keeps one LISTEN connection, opened
+with the first subscriber, and fans the notifications out to the asyncio
+queue of every open alert stream.
+
+After (re)connecting the listener sends a RESYNC change, since
+notifications issued while it was disconnected are lost.
+"""
+import asyncio
+import json
+
+import psycopg
+from django.conf import settings
+
+ALERT_CHANNEL = "alert_changes"
+RECONNECT_DELAY_S = 5
+QUEUE_SIZE = 100
+RESYNC = {"table": None, "op": "RESYNC", "id": None}
+
+_subscribers = set()
+_listener = None
+
+
+def subscribe():
+    """Returns a queue receiving every alert change; call from the event loop."""
+    global _listener
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    _subscribers.add(queue)
+    if _listener is None or _listener.done():
+        _listener = asyncio.get_running_loop().create_task(_listen())
+    return queue
+
+
+def unsubscribe(queue):
+    _subscribers.discard(queue)
+
+
+def _conninfo():
+    db = settings.DATABASES["default"]
+    return psycopg.conninfo.make_conninfo(
+        dbname=db["NAME"],
+        user=db.get("USER") or None,
+        password=db.get("PASSWORD") or None,
+        host=db.get("HOST") or None,
+        port=db.get("PORT") or None,
+        **db.get("OPTIONS", {}),
+    )
+
+
+def _broadcast(change):
+    for queue in list(_subscribers):
+        try:
+            queue.put_nowait(change)
+        except asyncio.QueueFull:
+            # A stream that fell this far behind just reloads everything
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESYNC)
+
+
+async def _listen():
+    while _subscribers:
+        try:
+            async with await psycopg.AsyncConnection.connect(_conninfo(), autocommit=True) as conn:
+                await conn.execute(f"LISTEN {ALERT_CHANNEL}")
+                _broadcast(RESYNC)
+                while _subscribers:
+                    # The timeout lets the listener stop once every stream has closed
+                    async for notify in conn.notifies(timeout=60):
+                        _broadcast(json.loads(notify.payload))
+        except (psycopg.Error, OSError):
+            await asyncio.sleep(RECONNECT_DELAY_S)
@@ -0,0 +1,29 @@
+"""
+Trail/alert impact index.
+
+rebuild_alert_impacts() replaces every TrailAlertImpact row with one
+set-based spatial join of the current alerts against trail routes, so
+lookups in either direction are plain indexed joins at request time.
+"""
+from django.db import connection, transaction
+
+from ..models import Trail, TrailAlertImpact, WeatherAlert
+
+# An alert is current while active and not yet ended. This also leaves out
+# the "No Active Weather Warnings" placeholder, which ends as it is created.
+CURRENT_ALERT_SQL = "a.is_active AND a.end_time > now()"
+
+
+def rebuild_alert_impacts():
+    """Recomputes the impact rows for all current alerts; returns how many there are."""
+    impacts = TrailAlertImpact._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {impacts}")
+        cursor.execute(f"""
+            INSERT INTO {impacts} (alert_id, trail_id, distance_m)
+            SELECT a.id, t.id, ST_Distance(t.route, a.location)
+            FROM {WeatherAlert._meta.db_table} a
+            JOIN {Trail._meta.db_table} t ON ST_DWithin(t.route, a.location, a.radius_km * 1000)
+            WHERE {CURRENT_ALERT_SQL}
+        """)
+        return cursor.rowcount
@@ -1,8 +1,19 @@
 import json
 from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from django.conf import settings
 from django.core.cache import cache
 import requests
 import hashlib
+import time
+from . import http_cache, metrics, rate_limit, request_memo
+
+# Upstream host -> provider name used in metrics
+UPSTREAM_PROVIDERS = {
+    "openaccess.pf.api.met.ie": "met_eireann",
+    "api.geocodify.com": "geocodify",
+    "api.openrouteservice.org": "openrouteservice",
+}
 
 class APICache:
     @staticmethod
@@ -10,23 +21,70 @@ class APICache:
         key_str = url
         if params:
             key_str += json.dumps(params, sort_keys=True)
-        return hashlib.md5(key_str.encode()).hexdigest()
+        return "apicache_" + hashlib.md5(key_str.encode()).hexdigest()
     
     @staticmethod
     def get_cached_response(url, params=None, timeout=60*60):
         cache_key = APICache.get_cache_key(url, params)
-        cached_response = cache.get(cache_key)
+        # Repeated lookups within a request skip the cache backend entirely
+        memoized = request_memo.get(("apicache", cache_key))
+        if memoized is not None:
+            metrics.cache_result("request_memo", True)
+            return memoized
+
+        # Entries are (expiry time, data) so responses built from them can
+        # expire with them (see http_cache.limit_freshness)
+        cached = cache.get(cache_key)
         
-        if cached_response is not None:
-            print(f"Cache hit for {cache_key}")
+        metrics.cache_result(f"apicache:{APICache.provider(url)}", cached is not None)
+        if cached is not None:
+            expires, cached_response = cached
+            http_cache.limit_freshness(expires - time.time())
+            request_memo.set(("apicache", cache_key), cached_response)
             return cached_response
         
+        data = APICache.fetch(url, params)
+        if data is not None:
+            cache.set(cache_key, (time.time() + timeout, data), timeout)
+            http_cache.limit_freshness(timeout)
+            request_memo.set(("apicache", cache_key), data)
+        return data
+
+    @staticmethod
+    def provider(url):
+        host = urlparse(url).hostname or ""
+        return UPSTREAM_PROVIDERS.get(host, host)
+
+    @staticmethod
+    def upstream_url(url):
+        """
+        Rewrites url according to settings.UPSTREAM_OVERRIDES, a mapping of
+        upstream base URL to replacement base URL. Used to point upstream
+        calls at local stand-ins (see the benchmark_api command).
+        """
+        for base, replacement in getattr(settings, "UPSTREAM_OVERRIDES", {}).items():
+            if url.startswith(base):
+                return replacement + url[len(base):]
+        return url
+
+    @staticmethod
+    def fetch(url, params=None):
+        """
+        Performs the upstream GET without touching the cache, within the
+        provider's rate limit (see rate_limit). Returns the decoded JSON or
+        the response text, or None on failure. Raises
+        rate_limit.UpstreamShed when the call is shed.
+        """
+        provider = APICache.provider(url)
+        rate_limit.acquire(provider)
         try:
-            response = requests.get(url, params=params)
+            with metrics.timed(f"upstream_{provider}"):
+                response = requests.get(APICache.upstream_url(url), params=params)
+            if response.status_code == 429:
+                retry_after = response.headers.get("Retry-After", "")
+                rate_limit.throttled(provider, float(retry_after) if retry_after.isdigit() else None)
             if response.status_code == 200:
-                data = response.json() if 'application/json' in response.headers.get('Content-Type', '') else response.text
-                cache.set(cache_key, data, timeout)
-                return data
+                return response.json() if 'application/json' in response.headers.get('Content-Type', '') else response.text
         except requests.RequestException:
             pass
         
@@ -0,0 +1,181 @@
+"""
+Snapshots of the in-process cache for warm restarts.
+
+Each worker periodically writes its hottest LocMem entries (upstream
+responses, trail GeoJSON, ready HTTP responses) to a local file and loads
+the newest snapshot when it boots, so a deploy or worker recycle doesn't
+start from an empty cache. Workers share the one file and each save
+replaces it, so a snapshot holds a single worker's entries: the last one
+to save.
+
+File format: SNAPSHOT_MAGIC, a 2-byte big-endian SNAPSHOT_VERSION, an
+HMAC-SHA256 (keyed with SECRET_KEY) of the rest, then a zlib-compressed
+pickle of {"created": unix time, "entries": [(key, expiry, pickled value),
+...]} listed hottest first. Keys and values are stored as LocMemCache holds
+them, so nothing is re-serialized. A snapshot with another version, a bad
+signature, or older than CACHE_SNAPSHOT_MAX_AGE, is ignored.
+
+Loading unpickles the file, so it lives in a directory only this user can
+write (created 0700, files 0600) and is only read when that still holds and
+its signature checks out.
+"""
+import atexit
+import hashlib
+import hmac
+import os
+import pickle
+import stat
+import struct
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import metrics
+
+SNAPSHOT_MAGIC = b"WXCACHE"
+SNAPSHOT_VERSION = 2
+SIGNATURE_SIZE = hashlib.sha256().digest_size
+MIN_REMAINING_TTL = 30  # Entries about to expire aren't worth saving
+
+_started = False
+
+
+def _backend():
+    backend = caches["default"]
+    return backend if isinstance(backend, LocMemCache) else None
+
+
+def _signature(payload):
+    return hmac.new(settings.SECRET_KEY.encode(), payload, hashlib.sha256).digest()
+
+
+def _is_private(path):
+    """
+    True if path is owned by this user and nobody else can write to it.
+    Always true where POSIX owners and modes don't apply (Windows).
+    """
+    info = os.stat(path)
+    if not hasattr(os, "getuid"):
+        return True
+    return info.st_uid == os.getuid() and not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def save(path, max_bytes):
+    """
+    Writes the cache entries, most recently used first, up to max_bytes of
+    keys and values. Returns the number of entries written.
+    """
+    backend = _backend()
+    if backend is None:
+        return 0
+    now = time.time()
+    with backend._lock:
+        # LocMemCache keeps entries in LRU order, most recent last
+        items = [(key, backend._expire_info.get(key), value) for key, value in reversed(backend._cache.items())]
+
+    entries = []
+    size = 0
+    for key, expires, value in items:
+        if expires is not None and expires - now < MIN_REMAINING_TTL:
+            continue
+        entry_size = len(key) + len(value)
+        if size + entry_size > max_bytes:
+            continue
+        entries.append((key, expires, value))
+        size += entry_size
+
+    payload = zlib.compress(pickle.dumps({"created": now, "entries": entries}, pickle.HIGHEST_PROTOCOL))
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not _is_private(directory):
+        return 0
+    # Write aside and rename so workers never read a half-written snapshot
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(SNAPSHOT_MAGIC + struct.pack(">H", SNAPSHOT_VERSION) + _signature(payload) + payload)
+    os.replace(tmp_path, path)
+    metrics.inc("api_cache_snapshot_entries_total", len(entries), action="saved")
+    return len(entries)
+
+
+def load(path, max_age):
+    """
+    Adds the snapshot's unexpired entries the cache doesn't already hold.
+    Returns the number of entries loaded.
+    """
+    backend = _backend()
+    if backend is None:
+        return 0
+    try:
+        if not (_is_private(os.path.dirname(os.path.abspath(path))) and _is_private(path)):
+            return 0
+        with open(path, "rb") as f:
+            data = f.read()
+        header_size = len(SNAPSHOT_MAGIC) + 2
+        if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            return 0
+        (version,) = struct.unpack(">H", data[len(SNAPSHOT_MAGIC):header_size])
+        if version != SNAPSHOT_VERSION:
+            return 0
+        signature = data[header_size:header_size + SIGNATURE_SIZE]
+        payload = data[header_size + SIGNATURE_SIZE:]
+        if not hmac.compare_digest(signature, _signature(payload)):
+            return 0
+        snapshot = pickle.loads(zlib.decompress(payload))
+    except (OSError, struct.error, zlib.error, pickle.UnpicklingError, EOFError):
+        return 0
+
+    now = time.time()
+    if now - snapshot["created"] > max_age:
+        return 0
+
+    loaded = 0
+    with backend._lock:
+        # Coldest first, so the hottest entries end up most recently used
+        for key, expires, value in reversed(snapshot["entries"]):
+            if key in backend._cache or (expires is not None and expires <= now):
+                continue
+            if len(backend._cache) >= backend._max_entries:
+                break
+            backend._cache[key] = value
+            backend._expire_info[key] = expires
+            loaded += 1
+    metrics.inc("api_cache_snapshot_entries_total", loaded, action="loaded")
+    return loaded
+
+
+def _save_periodically(path, interval, max_bytes):
+    while True:
+        time.sleep(interval)
+        try:
+            save(path, max_bytes)
+        except OSError:
+            pass
+
+
+def start():
+    """
+    Loads the latest snapshot and starts saving this worker's cache every
+    CACHE_SNAPSHOT_INTERVAL seconds and at exit. Called once per worker
+    from the WSGI entry point; a no-op without CACHE_SNAPSHOT_PATH.
+    """
+    global _started
+    path = getattr(settings, "CACHE_SNAPSHOT_PATH", None)
+    if _started or not path or _backend() is None:
+        return
+    _started = True
+    max_bytes = settings.CACHE_SNAPSHOT_MAX_BYTES
+
+    load(path, settings.CACHE_SNAPSHOT_MAX_AGE)
+    threading.Thread(
+        target=_save_periodically,
+        args=(path, settings.CACHE_SNAPSHOT_INTERVAL, max_bytes),
+        name="cache-snapshot",
+        daemon=True,
+    ).start()
+    atexit.register(lambda: save(path, max_bytes))
@@ -0,0 +1,87 @@
+"""
+Database-backed geocode store.
+
+Geocodes practically never change, so results from geocodify are kept in
+the GeocodeEntry table instead of the per-worker cache. Forward lookups are
+keyed on the normalized address; reverse lookups first look for a label
+previously reverse geocoded within REVERSE_MATCH_RADIUS_M of the requested
+point.
+"""
+import hashlib
+import re
+import unicodedata
+
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+
+from ..models import GeocodeEntry
+
+REVERSE_MATCH_RADIUS_M = 50
+REVERSE_KEY_PRECISION = 5  # ~1 m
+MAX_KEY_LENGTH = GeocodeEntry._meta.get_field("query_key").max_length
+MAX_LABEL_LENGTH = GeocodeEntry._meta.get_field("label").max_length
+
+
+def forward_key(address):
+    """
+    Casefolded address with accents stripped and punctuation collapsed.
+    Unlike location_index.normalize it keeps non-Latin letters, so such
+    addresses don't all share the empty key. Empty for punctuation-only
+    input, which is never stored. Keys too long for the column keep their
+    start followed by a hash of the whole text.
+    """
+    text = unicodedata.normalize("NFKD", address or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    key = re.sub(r"[\W_]+", " ", text.casefold()).strip()
+    if len(key) > MAX_KEY_LENGTH:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        key = f"{key[:MAX_KEY_LENGTH - len(digest) - 1]} {digest}"
+    return key
+
+
+def reverse_key(latitude, longitude):
+    return f"{round(float(latitude), REVERSE_KEY_PRECISION)},{round(float(longitude), REVERSE_KEY_PRECISION)}"
+
+
+def lookup_forward(address):
+    """Returns the stored GeocodeEntry for an address, or None."""
+    key = forward_key(address)
+    if not key:
+        return None
+    return GeocodeEntry.objects.filter(kind="FORWARD", query_key=key).first()
+
+
+def lookup_reverse(latitude, longitude, within_m=REVERSE_MATCH_RADIUS_M):
+    """
+    Returns the nearest stored reverse entry within `within_m` metres of the
+    point, or None. Forward entries are left out: their point may be a town
+    or county centroid, far coarser than a street-level reverse lookup.
+    Uses the spatial index on location.
+    """
+    point = Point(float(longitude), float(latitude), srid=4326)
+    return GeocodeEntry.objects.filter(kind="REVERSE", location__dwithin=(point, D(m=within_m))) \
+                               .annotate(distance=Distance("location", point)) \
+                               .order_by("distance") \
+                               .first()
+
+
+def store_forward(address, label, latitude, longitude):
+    key = forward_key(address)
+    if not key:
+        return None
+    entry, _ = GeocodeEntry.objects.update_or_create(
+        kind="FORWARD",
+        query_key=key,
+        defaults={"label": label[:MAX_LABEL_LENGTH], "location": Point(float(longitude), float(latitude), srid=4326)},
+    )
+    return entry
+
+
+def store_reverse(latitude, longitude, label):
+    entry, _ = GeocodeEntry.objects.update_or_create(
+        kind="REVERSE",
+        query_key=reverse_key(latitude, longitude),
+        defaults={"label": label[:MAX_LABEL_LENGTH], "location": Point(float(longitude), float(latitude), srid=4326)},
+    )
+    return entry
@@ -0,0 +1,144 @@
+"""
+Conditional GET support for cached JSON endpoints.
+
+conditional_response() stores each successful GET response as ready bytes
+(plus a gzipped copy when it is large enough to be worth it) together with a
+strong ETag derived from the content hash. Repeat requests are answered from
+that entry - a 304 when the client's If-None-Match matches - without running
+the view at all.
+
+A view built from data that expires sooner than the response would (a
+cached upstream entry, or "today") calls limit_freshness() so the stored
+response expires with it rather than outliving it.
+"""
+import gzip
+import hashlib
+import time
+from contextvars import ContextVar
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from . import metrics
+
+COMPRESS_MIN_BYTES = 1024
+
+_freshness = ContextVar("response_freshness", default=None)
+
+
+def limit_freshness(seconds):
+    """Caps how long the response being built may be cached, in seconds."""
+    limit = _freshness.get()
+    if limit is not None:
+        limit[0] = min(limit[0], seconds)
+
+
+def response_cache_key(request):
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    return "http_response_" + hashlib.md5(f"{request.path}?{query}".encode()).hexdigest()
+
+
+def build_entry(response, timeout):
+    body = response.content
+    digest = hashlib.sha1(body).hexdigest()
+    entry = {
+        "etag": f'"{digest}"',
+        "content_type": response["Content-Type"],
+        "body": body,
+        "gzip_etag": None,
+        "gzip_body": None,
+        "expires": time.time() + timeout,
+    }
+    if len(body) >= COMPRESS_MIN_BYTES:
+        entry["gzip_etag"] = f'"{digest}-gzip"'
+        entry["gzip_body"] = gzip.compress(body, compresslevel=6)
+    return entry
+
+
+def etag_matches(request, entry):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so ignore any W/ prefix
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return entry["etag"] in tags or (entry["gzip_etag"] is not None and entry["gzip_etag"] in tags)
+
+
+def accepts_gzip(request):
+    """
+    Whether Accept-Encoding allows gzip: listed (or matched by "*" when not
+    listed) with a non-zero q value.
+    """
+    qualities = {}
+    for item in request.headers.get("Accept-Encoding", "").split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    quality = qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0)))
+    return quality > 0
+
+
+def respond_from_entry(request, entry):
+    use_gzip = entry["gzip_body"] is not None and accepts_gzip(request)
+    etag = entry["gzip_etag"] if use_gzip else entry["etag"]
+
+    if etag_matches(request, entry):
+        response = HttpResponseNotModified()
+    elif use_gzip:
+        response = HttpResponse(entry["gzip_body"], content_type=entry["content_type"])
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(entry["body"], content_type=entry["content_type"])
+
+    response["ETag"] = etag
+    patch_cache_control(response, max_age=max(0, int(entry["expires"] - time.time())))
+    if entry["gzip_body"] is not None:
+        patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+def conditional_response(timeout):
+    """
+    Caches a view's successful GET responses for `timeout` seconds and
+    serves them with ETag/Cache-Control headers, answering matching
+    If-None-Match requests with 304 Not Modified. Other methods and non-200
+    responses pass straight through.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+
+            cache_key = response_cache_key(request)
+            entry = cache.get(cache_key)
+            metrics.cache_result("http_response", entry is not None)
+            if entry is None:
+                limit = [timeout]
+                token = _freshness.set(limit)
+                try:
+                    response = view(request, *args, **kwargs)
+                finally:
+                    _freshness.reset(token)
+                fresh_for = int(limit[0])
+                if response.status_code != 200 or response.streaming or fresh_for <= 0:
+                    return response
+                entry = build_entry(response, fresh_for)
+                cache.set(cache_key, entry, fresh_for)
+
+            return respond_from_entry(request, entry)
+        return wrapper
+    return decorator
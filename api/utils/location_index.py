@@ -0,0 +1,314 @@
+"""
+In-process autocomplete index for location suggestions.
+
+A prefix trie answers "starts with" lookups and a symmetric-delete dictionary
+answers typo-tolerant lookups. Both are built from a local gazetteer (trail
+towns, counties and places previously returned by the geocoder) so most
+suggestions are answered without leaving the worker.
+"""
+import re
+import threading
+import time
+import unicodedata
+
+from django.contrib.gis.db.models import PointField
+from django.db.models import Func
+
+MAX_RESULTS = 10
+MAX_FUZZY_TERM_LENGTH = 20
+MAX_LEARNED_ENTRIES = 2000  # Per index; dropped when it is rebuilt
+REBUILD_INTERVAL = 60 * 60  # Pick up newly imported trails once an hour
+
+
+class StartPoint(Func):
+    template = "ST_StartPoint(%(expressions)s::geometry)"
+    output_field = PointField(srid=4326)
+
+
+class EndPoint(Func):
+    template = "ST_EndPoint(%(expressions)s::geometry)"
+    output_field = PointField(srid=4326)
+
+
+def normalize(text):
+    """
+    Lowercases, strips accents and collapses punctuation/whitespace so
+    "Dún Laoghaire" and "dun  laoghaire" share the same key.
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+def max_edits(term):
+    """Number of typos tolerated for a term of this length."""
+    if len(term) < 4:
+        return 0
+    if len(term) < 8:
+        return 1
+    return 2
+
+
+def deletes(term, depth):
+    """All strings reachable from term by deleting up to `depth` characters."""
+    variants = {term}
+    frontier = {term}
+    for _ in range(depth):
+        next_frontier = set()
+        for word in frontier:
+            for i in range(len(word)):
+                next_frontier.add(word[:i] + word[i + 1:])
+        variants |= next_frontier
+        frontier = next_frontier
+    return variants
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance between a and b, or limit + 1 as soon
+    as it is known to exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class _TrieNode:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.top = []  # Best entry ids below this node, highest weight first
+
+
+class LocationIndex:
+    """
+    Gazetteer of named places supporting prefix and fuzzy lookups.
+
+    Each entry is stored once; the trie keeps the top MAX_RESULTS entry ids
+    at every node so a prefix lookup is a walk down the query characters.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._keys = {}
+        self._root = _TrieNode()
+        self._terms = {}
+        self._deletes = {}
+        self._learned = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, label, latitude, longitude, name=None, weight=1, id=None):
+        """
+        Adds a place to the index. `name` is the text matched against queries
+        and defaults to the label. Re-adding a known name is a no-op.
+        Returns whether the place was added.
+        """
+        key = normalize(name or label)
+        if not key or latitude is None or longitude is None:
+            return False
+        with self._lock:
+            if key in self._keys:
+                return False
+            entry_id = len(self._entries)
+            self._entries.append({
+                "id": str(id) if id else f"local:{entry_id}",
+                "label": label,
+                "name": name or label,
+                "latitude": latitude,
+                "longitude": longitude,
+                "weight": weight,
+            })
+            self._keys[key] = entry_id
+
+            tokens = key.split(" ")
+            starts = [0]
+            for token in tokens[:-1]:
+                starts.append(starts[-1] + len(token) + 1)
+            for start in starts:
+                self._insert_prefix(key[start:], entry_id, weight)
+
+            for term in {key, *tokens}:
+                if len(term) > MAX_FUZZY_TERM_LENGTH or max_edits(term) == 0:
+                    continue
+                self._terms.setdefault(term, set()).add(entry_id)
+                for variant in deletes(term, max_edits(term)):
+                    self._deletes.setdefault(variant, set()).add(term)
+        return True
+
+    def learn(self, label, latitude, longitude, id=None):
+        """
+        Adds a place returned by the geocoder, up to MAX_LEARNED_ENTRIES per
+        index. Returns whether the place was added.
+        """
+        if self._learned >= MAX_LEARNED_ENTRIES or not self.add(label, latitude, longitude, id=id):
+            return False
+        with self._lock:
+            self._learned += 1
+        return True
+
+    def _insert_prefix(self, text, entry_id, weight):
+        node = self._root
+        for char in text:
+            node = node.children.setdefault(char, _TrieNode())
+            if entry_id in node.top:
+                continue
+            node.top.append(entry_id)
+            node.top.sort(key=lambda i: -self._entries[i]["weight"])
+            del node.top[MAX_RESULTS:]
+
+    def prefix_matches(self, query):
+        # add() reorders node.top in place
+        with self._lock:
+            node = self._root
+            for char in query:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            return list(node.top)
+
+    def fuzzy_matches(self, query):
+        """
+        Returns (entry_id, matched_term) pairs within max_edits(query) typos,
+        closest first.
+        """
+        depth = max_edits(query)
+        # Nothing longer than this can be within `depth` deletes of an
+        # indexed term, and its delete variants grow combinatorially
+        if depth == 0 or len(query) > MAX_FUZZY_TERM_LENGTH + depth:
+            return []
+        variants = deletes(query, depth)
+        with self._lock:
+            candidates = {}
+            for variant in variants:
+                for term in self._deletes.get(variant, ()):
+                    candidates[term] = list(self._terms[term])
+
+        scored = []
+        for term, entry_ids in candidates.items():
+            distance = edit_distance(query, term, depth)
+            if distance <= depth:
+                for entry_id in entry_ids:
+                    scored.append((distance, -self._entries[entry_id]["weight"], entry_id, term))
+        scored.sort()
+        return [(entry_id, term) for _, _, entry_id, term in scored]
+
+    def suggest(self, query, limit=MAX_RESULTS):
+        """
+        Returns suggestions in the location-suggestions response format.
+        Prefix matches come first; fuzzy matches are labelled as corrections.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+
+        suggestions = []
+        seen = set()
+        for entry_id in self.prefix_matches(query):
+            seen.add(entry_id)
+            suggestions.append(self._format(entry_id))
+
+        if len(suggestions) < limit:
+            for entry_id, term in self.fuzzy_matches(query):
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+                suggestions.append(self._format(entry_id, correction=term))
+                if len(suggestions) >= limit:
+                    break
+
+        return suggestions[:limit]
+
+    def _format(self, entry_id, correction=None):
+        entry = self._entries[entry_id]
+        label = entry["label"]
+        if correction:
+            label = f"{label} (Did you mean: {correction.title()}?)"
+        return {
+            "id": entry["id"],
+            "label": label,
+            "value": entry["label"],
+            "longitude": entry["longitude"],
+            "latitude": entry["latitude"],
+        }
+
+
+def build_location_index():
+    """
+    Seeds a LocationIndex from the trail table: each trail's nearest towns
+    (placed at the route's start/finish) and each county (placed at the
+    mean of its trails' start points), plus every address previously
+    resolved through the geocode store. Towns referenced by more trails
+    rank higher.
+    """
+    from ..models import GeocodeEntry, Trail
+
+    towns = {}
+    counties = {}
+    rows = Trail.objects.annotate(start=StartPoint("route"), finish=EndPoint("route")) \
+                        .values_list("nearest_town_start", "nearest_town_finish", "county", "start", "finish")
+
+    for town_start, town_finish, county, start, finish in rows:
+        for town, point in ((town_start, start), (town_finish, finish)):
+            if not town or point is None:
+                continue
+            label = f"{town.strip()}, Co. {county.strip()}" if county else town.strip()
+            place = towns.setdefault(normalize(town), {"label": label, "name": town.strip(), "point": point, "weight": 0})
+            place["weight"] += 1
+        if county and start is not None:
+            place = counties.setdefault(normalize(county), {"name": county.strip(), "lat": 0.0, "lon": 0.0, "weight": 0})
+            place["lat"] += start.y
+            place["lon"] += start.x
+            place["weight"] += 1
+
+    index = LocationIndex()
+    for place in sorted(counties.values(), key=lambda p: -p["weight"]):
+        index.add(
+            f"Co. {place['name']}",
+            place["lat"] / place["weight"],
+            place["lon"] / place["weight"],
+            name=place["name"],
+            weight=place["weight"],
+        )
+    for place in sorted(towns.values(), key=lambda p: -p["weight"]):
+        index.add(place["label"], place["point"].y, place["point"].x, name=place["name"], weight=place["weight"])
+    for label, location in GeocodeEntry.objects.filter(kind="FORWARD").values_list("label", "location"):
+        index.add(label, location.y, location.x, id=label)
+    return index
+
+
+_index = None
+_built_at = 0
+_build_lock = threading.Lock()
+
+
+def get_location_index():
+    """
+    Returns this worker's LocationIndex, (re)building it from the database
+    when missing or older than REBUILD_INTERVAL. Places learned from the
+    geocoder's suggestions are not carried over, so they stay bounded; the
+    geocode store's addresses are reloaded by build_location_index().
+    """
+    global _index, _built_at
+    if _index is not None and time.monotonic() - _built_at < REBUILD_INTERVAL:
+        return _index
+    with _build_lock:
+        if _index is None or time.monotonic() - _built_at >= REBUILD_INTERVAL:
+            _index = build_location_index()
+            _built_at = time.monotonic()
+    return _index
@@ -0,0 +1,138 @@
+"""
+Per-route allocation profiles and cache memory usage for this worker.
+
+MemoryProfileMiddleware traces a sample of requests with tracemalloc
+(settings.MEMORY_PROFILE_SAMPLE_RATE, off by default) and records, per
+route, the peak allocated during the request, what was still allocated when
+it finished (cache entries, memoized payloads, leaks) and the source lines
+that allocated the most. Tracing is only switched on for a sampled request,
+so unsampled requests run at full speed.
+
+cache_usage() sizes the LocMem cache by key prefix. Both are served to staff
+by the /memory endpoint.
+"""
+import re
+import threading
+import tracemalloc
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+MAX_SITES_PER_ROUTE = 50  # Allocation sites kept per route across samples
+
+_lock = threading.Lock()
+# tracemalloc is process wide: trace one request at a time
+_tracing = threading.Lock()
+_profiles = {}
+
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def trace(call, frames=5):
+    """
+    Runs call() under tracemalloc. Returns (result, peak bytes, retained
+    bytes, snapshot), or (result, None, None, None) when another request is
+    already being traced.
+    """
+    if tracemalloc.is_tracing() or not _tracing.acquire(blocking=False):
+        return call(), None, None, None
+    try:
+        tracemalloc.start(frames)
+        try:
+            result = call()
+            retained, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        finally:
+            tracemalloc.stop()
+    finally:
+        _tracing.release()
+    return result, peak, retained, snapshot
+
+
+def record(route, peak, retained, snapshot, top_sites=10):
+    """Adds a traced request to the route's profile."""
+    sites = [
+        (str(stat.traceback[0]), stat.size, stat.count)
+        for stat in snapshot.statistics("lineno")[:top_sites]
+    ]
+    with _lock:
+        profile = _profiles.get(route)
+        if profile is None:
+            profile = _profiles[route] = {
+                "samples": 0, "peak_max": 0, "peak_sum": 0, "retained_max": 0, "retained_sum": 0, "sites": {},
+            }
+        profile["samples"] += 1
+        profile["peak_max"] = max(profile["peak_max"], peak)
+        profile["peak_sum"] += peak
+        profile["retained_max"] = max(profile["retained_max"], retained)
+        profile["retained_sum"] += retained
+        for site, size, count in sites:
+            totals = profile["sites"].setdefault(site, [0, 0])
+            totals[0] += size
+            totals[1] += count
+        if len(profile["sites"]) > MAX_SITES_PER_ROUTE:
+            kept = sorted(profile["sites"].items(), key=lambda item: item[1][0], reverse=True)
+            profile["sites"] = dict(kept[:MAX_SITES_PER_ROUTE])
+
+
+def profiles():
+    """{route: summary} of the requests traced so far, largest peak first."""
+    with _lock:
+        items = [(route, dict(profile, sites=dict(profile["sites"]))) for route, profile in _profiles.items()]
+
+    summaries = {}
+    for route, profile in sorted(items, key=lambda item: item[1]["peak_max"], reverse=True):
+        samples = profile["samples"]
+        sites = sorted(profile["sites"].items(), key=lambda item: item[1][0], reverse=True)
+        summaries[route] = {
+            "samples": samples,
+            "peak_max_bytes": profile["peak_max"],
+            "peak_mean_bytes": profile["peak_sum"] // samples,
+            "retained_max_bytes": profile["retained_max"],
+            "retained_mean_bytes": profile["retained_sum"] // samples,
+            "top_sites": [
+                {"site": site, "mean_bytes": size // samples, "mean_blocks": count // samples}
+                for site, (size, count) in sites[:10]
+            ],
+        }
+    return summaries
+
+
+def key_prefix(key):
+    """
+    The family a cache key belongs to: its leading words, up to the first
+    one holding coordinates or a hash ("top_trails_53.35_-6.26_route" ->
+    "top_trails").
+    """
+    # LocMemCache stores keys as "<KEY_PREFIX>:<version>:<key>"
+    key = key.split(":", 2)[-1]
+    words = []
+    for word in key.split("_"):
+        if re.search(r"[0-9.:-]", word):
+            break
+        words.append(word)
+    return "_".join(words) or "other"
+
+
+def cache_usage():
+    """
+    {prefix: {"entries": n, "bytes": key and pickled value bytes}} for the
+    default cache, largest first, or None if it isn't a LocMemCache.
+    """
+    backend = caches["default"]
+    if not isinstance(backend, LocMemCache):
+        return None
+    with backend._lock:
+        items = [(key, len(value)) for key, value in backend._cache.items()]
+
+    usage = {}
+    for key, size in items:
+        entry = usage.setdefault(key_prefix(key), {"entries": 0, "bytes": 0})
+        entry["entries"] += 1
+        entry["bytes"] += len(key) + size
+    return dict(sorted(usage.items(), key=lambda item: item[1]["bytes"], reverse=True))
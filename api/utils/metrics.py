@@ -0,0 +1,148 @@
+"""
+Request timing and Prometheus metrics.
+
+timed(phase) measures a block of work (db, upstream_<provider>, parse,
+serialize, ...). Each measurement is added to the current request's
+breakdown, which TimingMiddleware emits as a Server-Timing header, and to
+this worker's histograms, which /metrics renders in the Prometheus text
+format.
+
+Metrics are kept per process; every series carries a pid label so scrapes
+of different gunicorn workers can be told apart and summed.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+DESCRIPTIONS = {
+    "api_requests_total": ("counter", "Requests handled, by route, method and status."),
+    "api_request_duration_seconds": ("histogram", "Total request handling time, by route."),
+    "api_phase_duration_seconds": ("histogram", "Time spent in each phase of request handling."),
+    "api_cache_requests_total": ("counter", "Cache lookups, by key prefix and hit/miss."),
+    "api_cache_snapshot_entries_total": ("counter", "Cache entries saved to or loaded from snapshots."),
+    "api_upstream_shed_total": ("counter", "Upstream calls dropped for lack of rate-limit budget, by provider and priority."),
+    "api_upstream_throttled_total": ("counter", "Upstream 429 responses, by provider."),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+_request_timings = ContextVar("request_timings", default=None)
+_request_cache = ContextVar("request_cache", default=None)
+
+
+def _labels_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = (name, _labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    key = (name, _labels_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+
+def cache_result(prefix, hit):
+    inc("api_cache_requests_total", prefix=prefix, result="hit" if hit else "miss")
+    outcomes = _request_cache.get()
+    if outcomes is not None:
+        counts = outcomes.setdefault(prefix, [0, 0])
+        counts[0 if hit else 1] += 1
+
+
+def record_phase(phase, seconds):
+    observe("api_phase_duration_seconds", seconds, phase=phase)
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(phase, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+@contextmanager
+def timed(phase):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, perf_counter() - start)
+
+
+def start_request():
+    """Starts collecting a per-request breakdown; returns a token for end_request."""
+    return _request_timings.set({}), _request_cache.set({})
+
+
+def end_request(token):
+    """Stops collecting and returns {phase: [seconds, count]} for the request."""
+    timings_token, cache_token = token
+    timings = _request_timings.get()
+    _request_timings.reset(timings_token)
+    _request_cache.reset(cache_token)
+    return timings or {}
+
+
+def request_cache_outcomes():
+    """{cache prefix: [hits, misses]} for the current request so far."""
+    return dict(_request_cache.get() or {})
+
+
+def server_timing_header(timings, total_seconds):
+    parts = [
+        f'{phase};dur={seconds * 1000:.1f};desc="{count}x"'
+        for phase, (seconds, count) in timings.items()
+    ]
+    parts.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (f'{name}="{value}"'.replace("\n", " ") for name, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def render():
+    """Renders every metric in the Prometheus text exposition format."""
+    pid = ("pid", str(os.getpid()))
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: {"buckets": list(h["buckets"]), "sum": h["sum"], "count": h["count"]}
+                      for key, h in _histograms.items()}
+
+    lines = []
+    for name, (kind, description) in DESCRIPTIONS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels + (pid,))} {value}")
+        else:
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(BUCKETS, histogram["buckets"]):
+                    lines.append(f"{name}_bucket{_format_labels(labels + (pid, ('le', str(bound))))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (pid, ('le', '+Inf')))} {histogram['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels + (pid,))} {histogram['sum']}")
+                lines.append(f"{name}_count{_format_labels(labels + (pid,))} {histogram['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,142 @@
+"""
+Per-provider token buckets for the upstream APIs, shared by every worker.
+
+Each provider's bucket is an UpstreamBudget row, refilled and debited in a
+single UPDATE so concurrent workers never overspend it. Calls carry a
+priority: interactive requests may drain the whole bucket, background work
+(imports, precomputation) only what is left above BACKGROUND_RESERVE, so it
+yields to users as the budget runs low. When no token is available a call
+waits for the refill up to its priority's maximum wait and is then shed:
+acquire() raises UpstreamShed, which views answer with a 503 (see
+api.middleware.UpstreamShedMiddleware). Interactive calls only wait a few
+hundred milliseconds, as they hold a web worker while they do.
+
+Limits come from settings.UPSTREAM_RATE_LIMITS; providers without an entry
+are not limited. settings.UPSTREAM_MAX_WAIT_SECONDS overrides the maximum
+waits per priority.
+"""
+import math
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import DateTimeField, Func
+
+from ..models import UpstreamBudget
+from . import metrics
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Share of the bucket background calls must leave for interactive ones
+BACKGROUND_RESERVE = 0.5
+MAX_WAIT_SECONDS = {INTERACTIVE: 0.3, BACKGROUND: 60.0}
+
+_priority = ContextVar("upstream_priority", default=INTERACTIVE)
+_known_buckets = set()
+
+# Bucket level after refilling for the time elapsed since the last update
+_LEVEL_SQL = "LEAST(%s, tokens + %s * EXTRACT(EPOCH FROM clock_timestamp() - updated_at))"
+
+
+class UpstreamShed(Exception):
+    """A call shed for lack of budget; retry_after is whole seconds until one should fit."""
+
+    def __init__(self, provider, retry_after):
+        super().__init__(f"{provider} is over its rate limit")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+@contextmanager
+def priority(level):
+    """Runs the upstream calls made inside the block at the given priority."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def limits(provider):
+    return getattr(settings, "UPSTREAM_RATE_LIMITS", {}).get(provider)
+
+
+def max_wait(level):
+    return getattr(settings, "UPSTREAM_MAX_WAIT_SECONDS", {}).get(level, MAX_WAIT_SECONDS[level])
+
+
+def _ensure_bucket(provider, burst):
+    if provider not in _known_buckets:
+        UpstreamBudget.objects.get_or_create(provider=provider, defaults={"tokens": burst})
+        _known_buckets.add(provider)
+
+
+def _take(provider, rate, burst, floor):
+    """
+    Takes one token if that leaves at least `floor` in the bucket. Returns 0
+    on success, otherwise the seconds until a token should be available.
+    """
+    table = UpstreamBudget._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET tokens = {_LEVEL_SQL} - 1, updated_at = clock_timestamp() "
+            f"WHERE provider = %s AND {_LEVEL_SQL} >= %s + 1",
+            [burst, rate, provider, burst, rate, floor],
+        )
+        if cursor.rowcount:
+            return 0
+        cursor.execute(f"SELECT {_LEVEL_SQL} FROM {table} WHERE provider = %s", [burst, rate, provider])
+        row = cursor.fetchone()
+    available = row[0] if row else burst
+    return max(0.01, (floor + 1 - available) / rate)
+
+
+def acquire(provider):
+    """
+    Waits for a call to `provider` to fit its budget at the current
+    priority. Raises UpstreamShed when the call is shed instead.
+    """
+    config = limits(provider)
+    if not config:
+        return
+
+    rate, burst = config["rate"], config["burst"]
+    level = _priority.get()
+    floor = min(burst * BACKGROUND_RESERVE, burst - 1) if level == BACKGROUND else 0
+    _ensure_bucket(provider, burst)
+
+    start = time.monotonic()
+    deadline = start + max_wait(level)
+    while True:
+        wait = _take(provider, rate, burst, floor)
+        if wait == 0:
+            break
+        if time.monotonic() + wait > deadline:
+            metrics.inc("api_upstream_shed_total", provider=provider, priority=level)
+            raise UpstreamShed(provider, math.ceil(wait))
+        # Jitter so waiting workers don't all retry on the same tick
+        time.sleep(wait + random.uniform(0, 0.05))
+
+    waited = time.monotonic() - start
+    if waited > 0.01:
+        metrics.record_phase(f"ratelimit_{provider}", waited)
+
+
+def throttled(provider, retry_after=None):
+    """
+    Empties the provider's bucket after it answered 429, so every worker
+    backs off; with Retry-After it stays empty until then.
+    """
+    config = limits(provider)
+    metrics.inc("api_upstream_throttled_total", provider=provider)
+    if not config:
+        return
+    tokens = -config["rate"] * retry_after if retry_after else 0
+    # The database clock, as _take refills from it; Now() would be the
+    # transaction start
+    clock = Func(function="clock_timestamp", output_field=DateTimeField())
+    UpstreamBudget.objects.filter(provider=provider).update(tokens=tokens, updated_at=clock)
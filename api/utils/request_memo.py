@@ -0,0 +1,45 @@
+"""
+Per-request memoization.
+
+RequestMemoMiddleware gives every request an empty memo; memoize() returns
+the value already computed for a key during the current request instead of
+going back to the cache backend (and unpickling) or re-parsing the same
+payload. Outside a request, memoize() simply calls compute().
+"""
+from contextvars import ContextVar
+
+_memo = ContextVar("request_memo", default=None)
+_MISSING = object()
+
+
+def start():
+    """Starts a fresh memo; returns a token for end()."""
+    return _memo.set({})
+
+
+def end(token):
+    _memo.reset(token)
+
+
+def get(key, default=None):
+    memo = _memo.get()
+    if memo is None:
+        return default
+    return memo.get(key, default)
+
+
+def set(key, value):
+    memo = _memo.get()
+    if memo is not None:
+        memo[key] = value
+
+
+def memoize(key, compute):
+    """Returns compute() once per request for `key`, including None results."""
+    memo = _memo.get()
+    if memo is None:
+        return compute()
+    value = memo.get(key, _MISSING)
+    if value is _MISSING:
+        value = memo[key] = compute()
+    return value
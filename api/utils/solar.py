@@ -0,0 +1,90 @@
+"""
+Local sunrise, sunset and twilight computation.
+
+Implements the standard sunrise equation (NOAA / Meeus approximation,
+accurate to about a minute at Irish latitudes), replacing the round trip to
+sunrise-sunset.org. solar_table() evaluates a whole grid of locations and
+dates in one pass, sharing the per-date terms between locations.
+"""
+import math
+from datetime import date, datetime, timedelta, timezone
+
+J2000 = 2451545.0
+J2000_DATE = date(2000, 1, 1)
+J2000_DATETIME = datetime(2000, 1, 1, 12, tzinfo=timezone.utc)
+OBLIQUITY = math.radians(23.4397)
+
+# Solar elevation (degrees) at which each event happens
+SUN_ALTITUDES = {
+    "sunrise": -0.833,  # Refraction plus the sun's radius
+    "civil": -6.0,
+    "nautical": -12.0,
+    "astronomical": -18.0,
+}
+
+
+def julian_to_datetime(julian_day):
+    return J2000_DATETIME + timedelta(days=julian_day - J2000)
+
+
+def _hour_angle(altitude, sin_lat, cos_lat, sin_dec, cos_dec):
+    """
+    Hour angle (degrees) at which the sun crosses `altitude`, or None when
+    it stays above or below it all day (polar day/night).
+    """
+    cos_omega = (math.sin(math.radians(altitude)) - sin_lat * sin_dec) / (cos_lat * cos_dec)
+    if cos_omega < -1 or cos_omega > 1:
+        return None
+    return math.degrees(math.acos(cos_omega))
+
+
+def solar_table(locations, dates):
+    """
+    Computes solar events for every (location, date) pair.
+
+    locations: iterable of (latitude, longitude) in degrees, east positive.
+    dates: iterable of datetime.date (UTC days).
+
+    Returns a list (one per location) of lists (one per date) of dicts with
+    UTC datetimes for solar_noon, sunrise/sunset and the civil, nautical
+    and astronomical twilight bounds (None when the event does not occur),
+    plus day_length in seconds.
+    """
+    locations = [(float(lat), float(lon)) for lat, lon in locations]
+    days = [(d - J2000_DATE).days for d in dates]
+    table = []
+
+    for lat, lon in locations:
+        sin_lat = math.sin(math.radians(lat))
+        cos_lat = math.cos(math.radians(lat))
+        rows = []
+        for n in days:
+            mean_noon = n - lon / 360.0
+            anomaly = math.radians((357.5291 + 0.98560028 * mean_noon) % 360)
+            center = 1.9148 * math.sin(anomaly) + 0.0200 * math.sin(2 * anomaly) + 0.0003 * math.sin(3 * anomaly)
+            ecliptic_longitude = math.radians((math.degrees(anomaly) + center + 180 + 102.9372) % 360)
+            transit = J2000 + mean_noon + 0.0053 * math.sin(anomaly) - 0.0069 * math.sin(2 * ecliptic_longitude)
+            sin_dec = math.sin(ecliptic_longitude) * math.sin(OBLIQUITY)
+            cos_dec = math.cos(math.asin(sin_dec))
+
+            row = {"solar_noon": julian_to_datetime(transit)}
+            for event, altitude in SUN_ALTITUDES.items():
+                omega = _hour_angle(altitude, sin_lat, cos_lat, sin_dec, cos_dec)
+                begin = julian_to_datetime(transit - omega / 360.0) if omega is not None else None
+                end = julian_to_datetime(transit + omega / 360.0) if omega is not None else None
+                row[event] = (begin, end)
+                if event == "sunrise":
+                    if omega is not None:
+                        row["day_length"] = round(2 * omega / 360.0 * 86400)
+                    else:
+                        row["day_length"] = 86400 if sin_lat * sin_dec > 0 else 0
+            rows.append(row)
+        table.append(rows)
+
+    return table
+
+
+def sun_times(latitude, longitude, start_date, days=1):
+    """Solar events for one location over `days` consecutive dates."""
+    dates = [start_date + timedelta(days=i) for i in range(days)]
+    return list(zip(dates, solar_table([(latitude, longitude)], dates)[0]))
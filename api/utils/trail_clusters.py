@@ -0,0 +1,137 @@
+"""
+Trail markers clustered for low zoom levels.
+
+Trails are placed at their start point and grouped on a grid of
+CLUSTER_GRID_CELLS x CLUSTER_GRID_CELLS cells per web map tile (z/x/y,
+Web Mercator), so clusters line up with what the map draws. Each tile's
+clusters are computed in PostGIS by one aggregate query and cached on their
+own. A request for any bounding box is assembled from cached tiles, so
+panning only computes the tiles that come into view.
+
+Clusters never span two tiles, and those on the edge of the requested box
+may extend past it.
+"""
+import math
+
+from django.core.cache import cache
+from django.db import connection
+
+from . import metrics
+from ..models import Trail
+
+CLUSTER_GRID_CELLS = 4  # Per tile side: 64 px cells on 256 px tiles
+MAX_CLUSTER_ZOOM = 12  # Beyond this the trail listing is small enough
+MAX_CLUSTER_TILES = 100  # A large screen shows about 60
+CLUSTER_CACHE_TIMEOUT = 6 * 60 * 60  # Trails only change on import
+CLUSTER_PRECISION = 5  # ~1 m
+# Below this zoom a tile spans 180 degrees of longitude or more, too wide
+# for a geography bounding box (its edges become antipodal or degenerate)
+MIN_PREFILTER_ZOOM = 2
+
+
+def tiles_for_bbox(bbox, zoom):
+    """(x, y) of the zoom level's tiles covering bbox (min lon, min lat, max lon, max lat)."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    n = 2 ** zoom
+
+    def tile_x(lon):
+        return min(n - 1, max(0, int((lon + 180) / 360 * n)))
+
+    def tile_y(lat):
+        lat = max(-85.0511, min(85.0511, lat))
+        y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+        return min(n - 1, max(0, int(y)))
+
+    return [
+        (x, y)
+        for x in range(tile_x(min_lon), tile_x(max_lon) + 1)
+        for y in range(tile_y(max_lat), tile_y(min_lat) + 1)
+    ]
+
+
+def tile_clusters(zoom, x, y, activity=None):
+    """
+    The tile's clusters as a JSON array (text), largest first. Each has the
+    trail count, per-activity counts, the centre of its trails' start
+    points and their bounding box ([min lon, min lat, max lon, max lat]).
+    """
+    activity_condition = "AND t.activity = %s" if activity else ""
+    # Uses the route GiST index; wide tiles are cut by the Mercator test alone
+    prefilter = "AND t.route && ST_Transform(ST_TileEnvelope(%s, %s, %s), 4326)::geography" \
+        if zoom >= MIN_PREFILTER_ZOOM else ""
+    # A start point belongs to the tile whose half-open Mercator box holds
+    # it, so a trail on a tile edge is counted once
+    sql = f"""
+        SELECT COALESCE(json_agg(json_build_object(
+            'count', c.count,
+            'center', json_build_array(round(ST_X(c.center)::numeric, %s), round(ST_Y(c.center)::numeric, %s)),
+            'bbox', json_build_array(
+                round(ST_XMin(c.extent)::numeric, %s), round(ST_YMin(c.extent)::numeric, %s),
+                round(ST_XMax(c.extent)::numeric, %s), round(ST_YMax(c.extent)::numeric, %s)
+            ),
+            'activities', c.activities
+        ) ORDER BY c.count DESC), '[]'::json)::text
+        FROM (
+            SELECT sum(a.count)::int AS count,
+                   ST_Centroid(ST_Collect(a.points)) AS center,
+                   ST_Extent(a.points) AS extent,
+                   json_object_agg(a.activity, a.count) AS activities
+            FROM (
+                SELECT p.cell_x, p.cell_y, COALESCE(p.activity, 'Other') AS activity,
+                       count(*) AS count, ST_Collect(p.start) AS points
+                FROM (
+                    SELECT t.activity, s.start,
+                           floor((ST_X(m.start) - ST_XMin(e.tile)) * %s / (ST_XMax(e.tile) - ST_XMin(e.tile))) AS cell_x,
+                           floor((ST_YMax(e.tile) - ST_Y(m.start)) * %s / (ST_YMax(e.tile) - ST_YMin(e.tile))) AS cell_y,
+                           ST_X(m.start) AS mx, ST_Y(m.start) AS my, e.tile
+                    FROM {Trail._meta.db_table} t
+                    CROSS JOIN ST_TileEnvelope(%s, %s, %s) AS e(tile)
+                    CROSS JOIN LATERAL ST_StartPoint(COALESCE(t.route_low, t.route)::geometry) AS s(start)
+                    CROSS JOIN LATERAL ST_Transform(s.start, 3857) AS m(start)
+                    WHERE TRUE {prefilter}
+                      {activity_condition}
+                ) p
+                WHERE p.mx >= ST_XMin(p.tile) AND p.mx < ST_XMax(p.tile)
+                  AND p.my > ST_YMin(p.tile) AND p.my <= ST_YMax(p.tile)
+                GROUP BY p.cell_x, p.cell_y, COALESCE(p.activity, 'Other')
+            ) a
+            GROUP BY a.cell_x, a.cell_y
+        ) c
+    """
+    params = [CLUSTER_PRECISION] * 6 + [CLUSTER_GRID_CELLS] * 2 + [zoom, x, y]
+    if prefilter:
+        params += [zoom, x, y]
+    if activity:
+        params.append(activity)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0]
+
+
+def trail_clusters(bbox, zoom, activity=None):
+    """
+    Clusters of the trails starting in the tiles covering bbox at zoom, as
+    UTF-8 JSON bytes: {"zoom": zoom, "clusters": [...]}. Raises ValueError
+    when the box needs more than MAX_CLUSTER_TILES tiles.
+    """
+    tiles = tiles_for_bbox(bbox, zoom)
+    if len(tiles) > MAX_CLUSTER_TILES:
+        raise ValueError(f"bbox covers {len(tiles)} tiles at zoom {zoom}, the maximum is {MAX_CLUSTER_TILES}")
+
+    keys = {tile: f"trail_clusters_{zoom}_{tile[0]}_{tile[1]}_{activity or 'all'}" for tile in tiles}
+    cached = cache.get_many(keys.values())
+    missing = {}
+    parts = []
+    for tile, key in keys.items():
+        clusters = cached.get(key)
+        metrics.cache_result("trail_clusters", clusters is not None)
+        if clusters is None:
+            clusters = missing[key] = tile_clusters(zoom, *tile, activity=activity)
+        parts.append(clusters)
+    if missing:
+        cache.set_many(missing, CLUSTER_CACHE_TIMEOUT)
+
+    # Splice the tiles' arrays together rather than decode and re-encode them
+    items = [part.strip()[1:-1].strip() for part in parts]
+    body = ",".join(item for item in items if item)
+    return f'{{"zoom":{zoom},"clusters":[{body}]}}'.encode()
@@ -0,0 +1,432 @@
+"""
+Trail GeoJSON built inside PostGIS.
+
+The FeatureCollection is assembled with ST_AsGeoJSON/json_agg in a single
+query and returned as bytes, ready to be cached and written to the response.
+This skips model instantiation and Django's serializer, and the
+encode/decode round trips the views used to do to add distance_m. The output
+matches serialize("geojson", ..., geometry_field="route"), with coordinates
+limited to GEOJSON_PRECISION decimal places.
+"""
+import json
+
+from django.db import connection
+
+from ..models import Trail, TrailAlertImpact, WeatherAlert
+from .alert_impacts import CURRENT_ALERT_SQL
+
+GEOJSON_PRECISION = 6  # ~0.1 m
+
+ROUTE_FIELDS = ("route", *Trail.SIMPLIFIED_ROUTES)
+
+ALL_TRAIL_FIELDS = tuple(
+    field.name for field in Trail._meta.concrete_fields
+    if not field.primary_key and field.editable and field.name not in ROUTE_FIELDS
+)
+
+# Distance at which a search result's score is halved
+SEARCH_DISTANCE_DECAY_KM = 10
+
+# Maximum vertices per corridor piece in trails_along_route
+CORRIDOR_PIECE_VERTICES = 32
+
+# Geometry column served for each `detail` level, None omits the geometry
+DETAIL_LEVELS = {
+    "high": "route",
+    "medium": "route_medium",
+    "low": "route_low",
+    "none": None,
+}
+
+
+def geometry_field_from_request(request):
+    """
+    Reads the level-of-detail parameters and returns the geometry field to
+    serve (or None for no geometry). Raises ValueError on invalid input.
+
+      - detail: high (default), medium, low or none
+      - tolerance: metres of acceptable error; picks the coarsest
+        precomputed route within it (overrides detail)
+    """
+    tolerance = request.GET.get("tolerance")
+    if tolerance is not None:
+        tolerance_m = float(tolerance)
+        if tolerance_m < 0:
+            raise ValueError("tolerance must be positive")
+        field = "route"
+        # Degrees to metres, roughly, for the latitude of Ireland
+        for name, degrees in sorted(Trail.SIMPLIFIED_ROUTES.items(), key=lambda item: item[1]):
+            if degrees * 100000 <= tolerance_m:
+                field = name
+        return field
+
+    detail = request.GET.get("detail", "high")
+    if detail not in DETAIL_LEVELS:
+        raise ValueError(f"detail must be one of {', '.join(DETAIL_LEVELS)}")
+    return DETAIL_LEVELS[detail]
+
+
+def _property_sql(field_name):
+    field = Trail._meta.get_field(field_name)
+    column = f't."{field.column}"'
+    if field.get_internal_type() == "PointField":
+        # Django's serializer writes non-geometry spatial fields as EWKT
+        return f"CASE WHEN {column} IS NULL THEN NULL ELSE 'SRID=4326;' || ST_AsText({column}) END"
+    return column
+
+
+def feature_sql(fields, geometry_field, with_distance=False, precision=GEOJSON_PRECISION, extra_properties=None):
+    """
+    SQL (and params) building one GeoJSON Feature from a trail row aliased
+    `t`. with_distance adds t.distance_m to the properties;
+    extra_properties maps more property names to SQL expressions.
+    """
+    properties = ", ".join(f"'{name}', {_property_sql(name)}" for name in fields)
+    if fields == ALL_TRAIL_FIELDS:
+        properties += ", 'pk', t.id::text"
+    if with_distance:
+        properties += ", 'distance_m', t.distance_m"
+    for name, expression in (extra_properties or {}).items():
+        properties += f", '{name}', {expression}"
+
+    params = []
+    if geometry_field is None:
+        geometry_sql = "NULL::json"
+    else:
+        # Fall back to the full route for trails not simplified yet
+        column = Trail._meta.get_field(geometry_field).column
+        geometry_sql = f'ST_AsGeoJSON(COALESCE(t."{column}", t.route), %s)::json'
+        params.append(precision)
+
+    sql = f"""json_build_object(
+        'type', 'Feature',
+        'id', t.id,
+        'properties', json_build_object({properties}),
+        'geometry', {geometry_sql}
+    )"""
+    return sql, params
+
+
+def trail_feature_collection(fields=ALL_TRAIL_FIELDS, point=None, activity=None, limit=None,
+                             geometry_field="route", precision=GEOJSON_PRECISION):
+    """
+    Returns a trail FeatureCollection as UTF-8 JSON bytes.
+
+    fields: Trail fields to include as feature properties.
+    point: optional (lon, lat); adds distance_m to each feature and orders
+        the features nearest first.
+    activity: optional activity filter (e.g. "Cycling").
+    limit: optional maximum number of features.
+    geometry_field: route column to serve as the geometry (see
+        DETAIL_LEVELS), or None for features without geometry.
+    """
+    feature, params = feature_sql(fields, geometry_field, with_distance=point is not None, precision=precision)
+
+    inner_select = "SELECT *"
+    where = ""
+    order_by = "ORDER BY id"
+    agg_order = "t.id"
+    order_params = []
+    if point is not None:
+        inner_select += ", ST_Distance(route, ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography) AS distance_m"
+        params.extend(point)
+        # KNN ordering walks the route GiST index instead of sorting every trail
+        order_by = "ORDER BY route <-> ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography"
+        order_params.extend(point)
+        agg_order = "t.distance_m"
+    if activity:
+        where = "WHERE activity = %s"
+        params.append(activity)
+    params.extend(order_params)
+    if limit is not None:
+        order_by += " LIMIT %s"
+        params.append(limit)
+
+    sql = f"""
+        SELECT json_build_object(
+            'type', 'FeatureCollection',
+            'crs', json_build_object('type', 'name', 'properties', json_build_object('name', 'EPSG:4326')),
+            'features', COALESCE(json_agg({feature} ORDER BY {agg_order}), '[]'::json)
+        )::text
+        FROM ({inner_select} FROM {Trail._meta.db_table} {where} {order_by}) t
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0].encode()
+
+
+def nearest_trails_batch(origins, fields=ALL_TRAIL_FIELDS, geometry_field="route", precision=GEOJSON_PRECISION):
+    """
+    Nearest trails for many origins in a single statement: one LATERAL
+    index-assisted KNN subquery per origin.
+
+    origins: list of dicts with lat, lon, activity (or None) and limit.
+    Returns {"results": [{"origin": {...}, "type": "FeatureCollection",
+    "features": [...]}, ...]} as UTF-8 JSON bytes, in the order given.
+    """
+    feature, feature_params = feature_sql(fields, geometry_field, with_distance=True, precision=precision)
+    # The origins CTE comes first in the statement, then the feature SQL
+    params = [
+        list(range(len(origins))),
+        [float(origin["lon"]) for origin in origins],
+        [float(origin["lat"]) for origin in origins],
+        [origin.get("activity") for origin in origins],
+        [int(origin["limit"]) for origin in origins],
+    ] + feature_params
+
+    sql = f"""
+        WITH origins AS (
+            SELECT o.idx, o.lon, o.lat, o.activity, o.lim,
+                   ST_SetSRID(ST_MakePoint(o.lon, o.lat), 4326)::geography AS point
+            FROM unnest(%s::int[], %s::float8[], %s::float8[], %s::text[], %s::int[])
+                 AS o(idx, lon, lat, activity, lim)
+        ),
+        per_origin AS (
+            SELECT o.idx, o.lon, o.lat, o.activity, o.lim,
+                   COALESCE(json_agg({feature} ORDER BY t.distance_m) FILTER (WHERE t.id IS NOT NULL), '[]'::json)
+                       AS features
+            FROM origins o
+            LEFT JOIN LATERAL (
+                SELECT trail.*, ST_Distance(trail.route, o.point) AS distance_m
+                FROM {Trail._meta.db_table} trail
+                WHERE o.activity IS NULL OR trail.activity = o.activity
+                ORDER BY trail.route <-> o.point
+                LIMIT o.lim
+            ) t ON true
+            GROUP BY o.idx, o.lon, o.lat, o.activity, o.lim
+        )
+        SELECT json_build_object('results', COALESCE(json_agg(json_build_object(
+            'origin', json_build_object('lat', lat, 'lon', lon, 'activity', activity, 'limit', lim),
+            'type', 'FeatureCollection',
+            'features', features
+        ) ORDER BY idx), '[]'::json))::text
+        FROM per_origin
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0].encode()
+
+
+def trail_page(filters, fields, geometry_field, after=None, limit=50, precision=GEOJSON_PRECISION):
+    """
+    One page of a filtered trail listing, keyset-paginated on id.
+
+    filters: dict with any of activity (list), county (list), difficulty
+        (list), min_length, max_length (km) and bbox (min lon, min lat,
+        max lon, max lat).
+    after: id of the last trail on the previous page.
+
+    Returns a FeatureCollection with a "next" cursor (null on the last
+    page) as UTF-8 JSON bytes. Each feature's has_alert tells whether a
+    current weather alert affects the trail.
+    """
+    feature, feature_params = feature_sql(
+        fields, geometry_field, precision=precision,
+        extra_properties={"has_alert": f"""EXISTS (
+            SELECT 1 FROM {TrailAlertImpact._meta.db_table} i
+            JOIN {WeatherAlert._meta.db_table} a ON a.id = i.alert_id
+            WHERE i.trail_id = t.id AND {CURRENT_ALERT_SQL}
+        )"""},
+    )
+
+    conditions = []
+    params = []
+    for name in ("activity", "county", "difficulty"):
+        if filters.get(name):
+            conditions.append(f"{name} = ANY(%s)")
+            params.append(list(filters[name]))
+    if filters.get("min_length") is not None:
+        conditions.append("length_km >= %s")
+        params.append(filters["min_length"])
+    if filters.get("max_length") is not None:
+        conditions.append("length_km <= %s")
+        params.append(filters["max_length"])
+    if filters.get("bbox"):
+        conditions.append("route && ST_MakeEnvelope(%s, %s, %s, %s, 4326)::geography")
+        params.extend(filters["bbox"])
+    if after is not None:
+        conditions.append("id > %s")
+        params.append(after)
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+
+    # Fetch one extra row to know whether there is a next page
+    sql = f"""
+        SELECT json_build_object(
+            'type', 'FeatureCollection',
+            'crs', json_build_object('type', 'name', 'properties', json_build_object('name', 'EPSG:4326')),
+            'features', COALESCE(json_agg({feature} ORDER BY t.id) FILTER (WHERE t.position <= %s), '[]'::json),
+            'next', CASE WHEN count(*) > %s THEN (max(t.id) FILTER (WHERE t.position <= %s))::text END
+        )::text
+        FROM (
+            SELECT *, row_number() OVER (ORDER BY id) AS position
+            FROM (SELECT * FROM {Trail._meta.db_table} {where} ORDER BY id LIMIT %s) page
+        ) t
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, feature_params + [limit, limit, limit] + params + [limit + 1])
+        return cursor.fetchone()[0].encode()
+
+
+def search_trails(query, fields, geometry_field, point=None, max_distance_km=None, activity=None, limit=20,
+                  precision=GEOJSON_PRECISION):
+    """
+    Trails matching a search, best first, as FeatureCollection bytes.
+
+    A trail matches when its search_vector matches the query (web search
+    syntax: words, "phrases", -exclusions, OR) or when the query is
+    trigram-similar to a word sequence of its name, which catches typos.
+    score is the text rank plus the name similarity; with a point (lon,
+    lat) it is divided by 1 + distance / SEARCH_DISTANCE_DECAY_KM, and
+    max_distance_km keeps only trails that close.
+    """
+    feature, feature_params = feature_sql(fields, geometry_field, with_distance=point is not None,
+                                          precision=precision,
+                                          extra_properties={"score": "round(t.score::numeric, 4)"})
+
+    # The query is passed as literals rather than through a CTE so the
+    # planner can combine the GIN indexes in a bitmap OR
+    tsquery = "websearch_to_tsquery('english', %s)"
+    select = f"ts_rank_cd(trail.search_vector, {tsquery}) + word_similarity(%s, trail.name) AS relevance"
+    select_params = [query, query]
+    conditions = [f"(trail.search_vector @@ {tsquery} OR %s <%% trail.name)"]
+    params = [query, query]
+    score = "relevance"
+    if point is not None:
+        point_sql = "ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography"
+        select += f", ST_Distance(trail.route, {point_sql}) AS distance_m"
+        select_params.extend(point)
+        score = f"relevance / (1 + distance_m / {SEARCH_DISTANCE_DECAY_KM * 1000})"
+        if max_distance_km is not None:
+            conditions.append(f"ST_DWithin(trail.route, {point_sql}, %s)")
+            params.extend([*point, max_distance_km * 1000])
+    if activity:
+        conditions.append("trail.activity = %s")
+        params.append(activity)
+
+    sql = f"""
+        SELECT json_build_object(
+            'type', 'FeatureCollection',
+            'crs', json_build_object('type', 'name', 'properties', json_build_object('name', 'EPSG:4326')),
+            'features', COALESCE(json_agg({feature} ORDER BY t.score DESC, t.id), '[]'::json)
+        )::text
+        FROM (
+            SELECT *, {score} AS score
+            FROM (
+                SELECT trail.*, {select}
+                FROM {Trail._meta.db_table} trail
+                WHERE {" AND ".join(conditions)}
+            ) matches
+            ORDER BY score DESC, id
+            LIMIT %s
+        ) t
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, feature_params + select_params + params + [limit])
+        return cursor.fetchone()[0].encode()
+
+
+def trails_along_route(coordinates, distance_km, fields, geometry_field, activity=None, limit=50,
+                       precision=GEOJSON_PRECISION):
+    """
+    Trails within distance_km of a route, ordered by where along the route
+    they are, as FeatureCollection bytes. Features carry distance_m from
+    the route and route_position (0 at the start, 1 at the end).
+
+    coordinates: the route as [[lon, lat], ...].
+
+    The route is simplified, buffered and cut into small pieces with
+    ST_Subdivide, so each piece's bounding box only covers a short stretch
+    of the corridor; a single long line's box would cover most of the
+    country and defeat the route GiST index.
+    """
+    distance_m = distance_km * 1000
+    feature, feature_params = feature_sql(
+        fields, geometry_field, with_distance=True, precision=precision,
+        extra_properties={"route_position": "round(t.route_position::numeric, 4)"},
+    )
+    activity_sql = "AND trail.activity = %s" if activity else ""
+    line = json.dumps({"type": "LineString", "coordinates": coordinates})
+    # Simplify within a quarter of the corridor width, metres to degrees roughly
+    tolerance = distance_m / 4 / 100000
+
+    sql = f"""
+        WITH corridor AS (
+            SELECT ST_SimplifyPreserveTopology(ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326), %s) AS line
+        ),
+        pieces AS (
+            SELECT ST_Subdivide(ST_Buffer(line::geography, %s)::geometry, {CORRIDOR_PIECE_VERTICES})::geography AS piece
+            FROM corridor
+        ),
+        matches AS (
+            SELECT DISTINCT trail.id
+            FROM {Trail._meta.db_table} trail
+            JOIN pieces ON ST_Intersects(trail.route, pieces.piece)
+            WHERE true {activity_sql}
+        )
+        SELECT json_build_object(
+            'type', 'FeatureCollection',
+            'crs', json_build_object('type', 'name', 'properties', json_build_object('name', 'EPSG:4326')),
+            'features', COALESCE(json_agg({feature} ORDER BY t.route_position, t.id), '[]'::json)
+        )::text
+        FROM (
+            SELECT trail.*,
+                   ST_Distance(trail.route, corridor.line::geography) AS distance_m,
+                   ST_LineLocatePoint(corridor.line, ST_ClosestPoint(corridor.line, trail.route::geometry))
+                       AS route_position
+            FROM {Trail._meta.db_table} trail
+            JOIN matches ON matches.id = trail.id
+            CROSS JOIN corridor
+            ORDER BY route_position, trail.id
+            LIMIT %s
+        ) t
+    """
+    params = [line, tolerance, distance_m] + ([activity] if activity else []) + feature_params + [limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0].encode()
+
+
+def alert_affected_trails(fields, geometry_field, alert_id=None, severities=None, precision=GEOJSON_PRECISION):
+    """
+    Trails affected by current weather alerts, from the TrailAlertImpact
+    index, as FeatureCollection bytes. Each feature lists its alerts
+    (nearest first) in an "alerts" property.
+
+    alert_id: only trails affected by this alert.
+    severities: only alerts with one of these severities.
+    """
+    feature, feature_params = feature_sql(fields, geometry_field, precision=precision,
+                                          extra_properties={"alerts": "t.alerts"})
+    conditions = [CURRENT_ALERT_SQL]
+    params = []
+    if alert_id is not None:
+        conditions.append("a.id = %s")
+        params.append(alert_id)
+    if severities:
+        conditions.append("a.severity = ANY(%s)")
+        params.append(list(severities))
+
+    sql = f"""
+        SELECT json_build_object(
+            'type', 'FeatureCollection',
+            'crs', json_build_object('type', 'name', 'properties', json_build_object('name', 'EPSG:4326')),
+            'features', COALESCE(json_agg({feature} ORDER BY t.id), '[]'::json)
+        )::text
+        FROM (
+            SELECT trail.*, affected.alerts
+            FROM {Trail._meta.db_table} trail
+            JOIN (
+                SELECT i.trail_id, json_agg(json_build_object(
+                    'id', a.id, 'title', a.title, 'severity', a.severity,
+                    'start_time', a.start_time, 'end_time', a.end_time, 'distance_m', i.distance_m
+                ) ORDER BY i.distance_m) AS alerts
+                FROM {TrailAlertImpact._meta.db_table} i
+                JOIN {WeatherAlert._meta.db_table} a ON a.id = i.alert_id
+                WHERE {" AND ".join(conditions)}
+                GROUP BY i.trail_id
+            ) affected ON affected.trail_id = trail.id
+        ) t
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, feature_params + params)
+        return cursor.fetchone()[0].encode()
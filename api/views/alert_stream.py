@@ -0,0 +1,188 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+
+from ..models import UserWeatherAlert, WeatherAlert
+from ..utils import alert_changes
+from ..utils.rate_limit import UpstreamShed
+from .get_top_trails_weather_segments import forecast_from_times, forecast_url, load_forecast_times
+from .user_weather_alerts import check_alert_condition
+
+MAX_STREAM_LOCATIONS = 10
+MAX_STREAM_USER_ALERTS = 10
+ALERT_RADIUS_KM = 50  # Same radius as get_weather_alerts
+HEARTBEAT_S = 25
+USER_ALERT_RECHECK_S = 15 * 60  # The forecast cache lifetime
+DEBOUNCE_S = 0.5
+RETRY_MS = 5000
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+@sync_to_async
+def active_alerts_near(points):
+    """{id: alert} for the active weather alerts near any of the points."""
+    near = Q()
+    for point in points:
+        near |= Q(location__dwithin=(point, D(km=ALERT_RADIUS_KM)))
+    alerts = WeatherAlert.objects.filter(near, is_active=True).values(
+        'id', 'title', 'description', 'severity', 'start_time', 'end_time'
+    )
+    return {alert['id']: alert for alert in alerts}
+
+
+@sync_to_async
+def active_user_alerts(alert_ids):
+    return list(UserWeatherAlert.objects.filter(id__in=alert_ids, active=True))
+
+
+# Off the shared sync thread: upstream calls there would hold up every other
+# stream's database queries
+@sync_to_async(thread_sensitive=False)
+def current_forecast(point, now):
+    try:
+        return forecast_from_times(load_forecast_times(forecast_url(point.y, point.x)), now)
+    except UpstreamShed:
+        # Checked again on the next poll
+        return None
+    finally:
+        # The rate limit check connects from this pool thread
+        connection.close()
+
+
+async def triggered_user_alerts(alert_ids, points):
+    """
+    {id: message} for the given user alerts that the current forecast
+    triggers, at the alert's own location or else the first stream location.
+    """
+    now = datetime.now(dt_timezone.utc).replace(tzinfo=None)
+    alerts = await active_user_alerts(alert_ids)
+    locations = {}
+    for alert in alerts:
+        point = alert.location or points[0]
+        locations.setdefault((point.x, point.y), point)
+    forecasts = dict(zip(locations, await asyncio.gather(*(current_forecast(point, now) for point in locations.values()))))
+    triggered = {}
+    for alert in alerts:
+        point = alert.location or points[0]
+        current = forecasts[(point.x, point.y)]
+        if current and check_alert_condition(alert, current):
+            triggered[alert.id] = {
+                "id": alert.id,
+                "name": alert.name,
+                "message": f"{alert.name}: {alert.get_condition_display()} is {alert.get_comparison_display()} {alert.threshold}"
+            }
+    return triggered
+
+
+def changed_kinds(change, user_alert_ids):
+    if change["op"] == "RESYNC":
+        return {"weather", "user"}
+    if change["table"] == WeatherAlert._meta.db_table:
+        return {"weather"}
+    if change["table"] == UserWeatherAlert._meta.db_table and change["id"] in user_alert_ids:
+        return {"user"}
+    return set()
+
+
+def diff_events(known, current, event, removed_event):
+    """Events turning `known` into `current`; updates `known` in place."""
+    events = []
+    for key, value in current.items():
+        if known.get(key) != value:
+            events.append(sse_event(event, value))
+    for key in known.keys() - current.keys():
+        events.append(sse_event(removed_event, {"id": key}))
+    known.clear()
+    known.update(current)
+    return events
+
+
+async def alert_events(points, user_alert_ids):
+    """
+    Sends the current alerts, then every change to them: weather-alert for
+    a new or changed weather alert near the points, weather-alert-removed
+    when one ends, and user-alert / user-alert-cleared as subscribed user
+    alerts start or stop being triggered. Comments keep idle connections
+    open.
+    """
+    queue = alert_changes.subscribe()
+    known_alerts = {}
+    known_triggered = {}
+    pending = {"weather", "user"}
+    recheck_at = 0
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            if "weather" in pending:
+                for event in diff_events(known_alerts, await active_alerts_near(points),
+                                         "weather-alert", "weather-alert-removed"):
+                    yield event
+            if user_alert_ids and ("user" in pending or time.monotonic() >= recheck_at):
+                for event in diff_events(known_triggered, await triggered_user_alerts(user_alert_ids, points),
+                                         "user-alert", "user-alert-cleared"):
+                    yield event
+                recheck_at = time.monotonic() + USER_ALERT_RECHECK_S
+            pending = set()
+
+            try:
+                change = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_S)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            pending |= changed_kinds(change, user_alert_ids)
+            # fetch_weather_alerts rewrites every alert at once; handle the burst together
+            await asyncio.sleep(DEBOUNCE_S)
+            while not queue.empty():
+                pending |= changed_kinds(queue.get_nowait(), user_alert_ids)
+    finally:
+        alert_changes.unsubscribe(queue)
+
+
+async def stream_alerts(request):
+    """
+    Server-Sent Events stream of alert changes, served by the ASGI
+    application only (see weather/asgi.py).
+
+    GET parameters:
+      - locations: "lat,lon;lat,lon;..." (up to 10) to receive weather
+        alerts for
+      - user_alerts (optional): comma-separated UserWeatherAlert ids (up to
+        10) to be told about when the current forecast triggers them
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=400)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "The alert stream is only served by the ASGI application"}, status=400)
+
+    try:
+        points = []
+        for location in request.GET.get("locations", "").split(";"):
+            if location.strip():
+                lat, lon = (float(value) for value in location.split(","))
+                points.append(Point(lon, lat, srid=4326))
+        user_alerts = request.GET.get("user_alerts", "")
+        user_alert_ids = {int(value) for value in user_alerts.split(",") if value.strip()}
+    except ValueError:
+        return JsonResponse({"error": "Invalid locations or user_alerts"}, status=400)
+    if not 1 <= len(points) <= MAX_STREAM_LOCATIONS:
+        return JsonResponse({"error": f"Between 1 and {MAX_STREAM_LOCATIONS} locations are required"}, status=400)
+    if len(user_alert_ids) > MAX_STREAM_USER_ALERTS:
+        return JsonResponse({"error": f"At most {MAX_STREAM_USER_ALERTS} user_alerts are allowed"}, status=400)
+
+    response = StreamingHttpResponse(alert_events(points, user_alert_ids), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Stop nginx from buffering the stream
+    return response
@@ -0,0 +1,222 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.gis.geos import Point
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+
+from ..models import SegmentForecast, Trail, TrailSegment
+from ..utils import request_memo
+from .get_top_trails_weather_segments import (
+    forecast_from_times,
+    forecast_url,
+    get_top_trails,
+    load_forecast_times,
+    to_utc_hour,
+)
+
+DEFAULT_HORIZON_HOURS = 48
+MAX_HORIZON_HOURS = 72
+DEFAULT_WINDOWS = 5
+DEFAULT_WEIGHTS = {
+    "rain_weight": 1.0,  # per mm of rain
+    "wind_weight": 0.1,  # per km/h above COMFORTABLE_WIND_KMH
+    "temperature_weight": 0.2,  # per degree away from ideal_temperature
+}
+DEFAULT_IDEAL_TEMPERATURE = 15.0
+COMFORTABLE_WIND_KMH = 20
+HOUR = timedelta(hours=1)
+
+
+def parse_scoring_parameters(request):
+    """Reads the horizon, window count and score weights. Raises ValueError."""
+    try:
+        start = request.GET.get("datetime")
+        start = to_utc_hour(datetime.fromisoformat(start)) if start else to_utc_hour(timezone.now())
+        horizon = int(request.GET.get("horizon", DEFAULT_HORIZON_HOURS))
+        windows = int(request.GET.get("windows", DEFAULT_WINDOWS))
+        weights = {name: float(request.GET.get(name, default)) for name, default in DEFAULT_WEIGHTS.items()}
+        weights["ideal_temperature"] = float(request.GET.get("ideal_temperature", DEFAULT_IDEAL_TEMPERATURE))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid parameter: {e}")
+    if not 1 <= horizon <= MAX_HORIZON_HOURS:
+        raise ValueError(f"horizon must be between 1 and {MAX_HORIZON_HOURS}")
+    return start, horizon, max(1, windows), weights
+
+
+def penalty(weights, rain, wind_speed, temperature):
+    """Discomfort of one segment-hour; None when the forecast is missing."""
+    if rain is None or wind_speed is None or temperature is None:
+        return None
+    return (
+        weights["rain_weight"] * rain
+        + weights["wind_weight"] * max(0, wind_speed - COMFORTABLE_WIND_KMH)
+        + weights["temperature_weight"] * abs(temperature - weights["ideal_temperature"])
+    )
+
+
+def hourly_forecast(forecast_times, start, length):
+    """
+    (rain, wind_speed, temperature) for `length` hours from `start`, each
+    from the forecast entry nearest the hour as forecast_from_times() picks
+    it, in one pass over the forecast rather than a scan per hour.
+    """
+    if not forecast_times:
+        return [None] * length
+    # One entry per instant, with its hour's precipitation merged in
+    first_at = {}
+    for forecast_dt, time_elem in forecast_times:
+        first_at.setdefault(forecast_dt, time_elem)
+    times = sorted(first_at)
+
+    values = {}
+    hours = []
+    i = 0
+    for hour in range(length):
+        target = (start + hour * HOUR).astimezone(dt_timezone.utc).replace(tzinfo=None)
+        while i + 1 < len(times) and times[i + 1] <= target:
+            i += 1
+        nearest = times[i]
+        if i + 1 < len(times) and abs(times[i + 1] - target) < abs(nearest - target):
+            nearest = times[i + 1]
+        if nearest not in values:
+            forecast = forecast_from_times([(nearest, first_at[nearest])], target)
+            values[nearest] = (forecast["rain"], forecast["wind_speed"], forecast["temperature"]) if forecast else None
+        hours.append(values[nearest])
+    return hours
+
+
+def load_segment_timelines(trails, start, horizon):
+    """
+    Hourly (rain, wind_speed, temperature) arrays from `start` for every
+    segment of the given trails, long enough to cover `horizon` start hours
+    plus the trail's longest segment offset, read from SegmentForecast in
+    one query. Hours without a precomputed row (past the refresh window)
+    are filled from the segment's forecast, converted to hours once per
+    forecast URL. Returns {trail id: [(offset hours, timeline), ...]}
+    ordered by segment.
+    """
+    segments = list(
+        TrailSegment.objects.filter(trail__in=[trail.pk for trail in trails])
+                            .only("id", "trail_id", "segment_index", "start_time_offset", "segment_point")
+                            .order_by("trail_id", "segment_index")
+    )
+    length = horizon + max((int(segment.start_time_offset / HOUR) for segment in segments), default=0) + 1
+    timelines = {segment.pk: [None] * length for segment in segments}
+    rows = SegmentForecast.objects.filter(
+        segment__in=[segment.pk for segment in segments],
+        target_time__gte=start,
+        target_time__lt=start + length * HOUR,
+    ).values_list("segment_id", "target_time", "rain", "wind_speed", "temperature")
+    for segment_id, target_time, rain, wind_speed, temperature in rows:
+        timelines[segment_id][(target_time - start) // HOUR] = (rain, wind_speed, temperature)
+
+    by_trail = {trail.pk: [] for trail in trails}
+    for segment in segments:
+        timeline = timelines[segment.pk]
+        if None in timeline:
+            url = forecast_url(segment.segment_point.y, segment.segment_point.x)
+            fallback = request_memo.memoize(
+                ("forecast_hours", url, start, length),
+                lambda: hourly_forecast(load_forecast_times(url), start, length),
+            )
+            for hour, value in enumerate(timeline):
+                if value is None:
+                    timeline[hour] = fallback[hour]
+        offset = int(segment.start_time_offset / HOUR)
+        by_trail[segment.trail_id].append((offset, timeline))
+    return by_trail
+
+
+def score_start_times(segment_timelines, horizon, weights):
+    """
+    Scores every start hour in one pass per segment: each segment's
+    penalty array is shifted by its time offset and added to the running
+    total, so start hour t sees the segment's forecast at t + offset.
+    Returns the mean penalty per segment for each start hour (None where a
+    forecast is missing, and everywhere for a trail without segments).
+    """
+    if not segment_timelines:
+        return [None] * horizon
+    totals = [0.0] * horizon
+    for offset, timeline in segment_timelines:
+        penalties = [penalty(weights, *value) if value else None for value in timeline[offset:offset + horizon]]
+        penalties += [None] * (horizon - len(penalties))
+        totals = [None if total is None or p is None else total + p for total, p in zip(totals, penalties)]
+    count = len(segment_timelines)
+    return [None if total is None else total / count for total in totals]
+
+
+def describe_window(segment_timelines, start, hour, score):
+    along = [timeline[hour + offset] for offset, timeline in segment_timelines
+             if hour + offset < len(timeline) and timeline[hour + offset]]
+    duration = max((offset for offset, _ in segment_timelines), default=0) + 1
+    return {
+        "start": (start + hour * HOUR).isoformat(),
+        "end": (start + (hour + duration) * HOUR).isoformat(),
+        "score": round(score, 3),
+        "rain_mm": round(sum(rain for rain, _, _ in along), 1),
+        "max_wind_speed": max((wind for _, wind, _ in along), default=None),
+        "min_temperature": min((temp for _, _, temp in along), default=None),
+        "max_temperature": max((temp for _, _, temp in along), default=None),
+    }
+
+
+@csrf_exempt
+def get_best_start_times(request):
+    """
+    Ranks start hours for a trail, or for the trails nearest a location,
+    by a weighted rain/wind/temperature discomfort score (lower is better).
+
+    GET parameters:
+      - trail: object_id of a trail, or
+      - lat, lon (+ optional activity_type, max_distance): the 5 nearest trails
+      - datetime: first candidate start (ISO 8601, default now)
+      - horizon: number of hourly start times to consider (default 48)
+      - windows: number of ranked start times per trail (default 5)
+      - rain_weight, wind_weight, temperature_weight, ideal_temperature
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=400)
+
+    try:
+        start, horizon, window_count, weights = parse_scoring_parameters(request)
+        object_id = request.GET.get("trail")
+        if object_id:
+            trails = list(Trail.objects.filter(object_id=int(object_id)).defer(*Trail.SIMPLIFIED_ROUTES, "route"))
+            if not trails:
+                return JsonResponse({"error": "Trail not found"}, status=404)
+        else:
+            lat = float(request.GET["lat"])
+            lon = float(request.GET["lon"])
+            max_distance_km = float(request.GET.get("max_distance", 50))
+            trails = list(get_top_trails(request.GET.get("activity_type"), Point(lon, lat, srid=4326),
+                                         limit=5, max_distance_km=max_distance_km, geometry_field=None))
+    except KeyError:
+        return JsonResponse({"error": "trail or lat and lon are required."}, status=400)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    timelines = load_segment_timelines(trails, start, horizon)
+
+    results = []
+    for trail in trails:
+        segment_timelines = timelines[trail.pk]
+        scores = score_start_times(segment_timelines, horizon, weights)
+        ranked = sorted((score, hour) for hour, score in enumerate(scores) if score is not None)
+        result = {
+            "object_id": trail.object_id,
+            "name": trail.name,
+            "activity": trail.activity,
+            "windows": [describe_window(segment_timelines, start, hour, score) for score, hour in ranked[:window_count]],
+        }
+        if hasattr(trail, "distance"):
+            result["distance_m"] = trail.distance.m
+        results.append(result)
+
+    return JsonResponse({
+        "start": start.astimezone(dt_timezone.utc).isoformat(),
+        "horizon_hours": horizon,
+        "weights": weights,
+        "trails": results,
+    })
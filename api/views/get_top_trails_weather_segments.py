@@ -1,14 +1,19 @@
 import json
 import requests
 import xml.etree.ElementTree as ET
-from datetime import datetime
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db.models import DateTimeField, ExpressionWrapper, JSONField, OuterRef, Subquery, Value
+from django.db.models.functions import JSONObject
 from django.http import JsonResponse
+from django.utils import timezone
 from django.contrib.gis.geos import Point
 from django.contrib.gis.db.models.functions import Distance
 from django.contrib.gis.measure import D
 from django.views.decorators.csrf import csrf_exempt
-from ..models import Trail
+from ..models import SegmentForecast, Trail, TrailSegment
+from ..utils import metrics, request_memo
 from ..utils.api_cache import APICache
+from ..utils.trail_geojson import ROUTE_FIELDS, geometry_field_from_request
 
 
 def parse_parameters(request):
@@ -32,28 +37,77 @@ def parse_parameters(request):
         raise ValueError(f"Invalid parameter: {e}")
     return lat, lon, base_dt, activity_type, max_distance
 
+def forecast_url(lat, lon):
+    return f"http://openaccess.pf.api.met.ie/metno-wdb2ts/locationforecast?lat={lat};long={lon}"
+
+def parse_forecast_times(root):
+    """
+    (forecast datetime, <time> element) pairs from a parsed forecast
+    document, one per instant. The feed gives temperature, wind and cloud
+    at an instant (from == to) and precipitation over the period starting
+    there (from=T, to=T+1h, longer further out): the shortest such period's
+    precipitation is merged into the instant's element, and the period
+    elements are dropped.
+    """
+    instants = []
+    periods = {}
+    for time_elem in root.findall(".//time"):
+        try:
+            forecast_dt = datetime.strptime(time_elem.get("from"), "%Y-%m-%dT%H:%M:%SZ")
+            until = datetime.strptime(time_elem.get("to") or time_elem.get("from"), "%Y-%m-%dT%H:%M:%SZ")
+        except Exception:
+            continue
+        if until == forecast_dt:
+            instants.append((forecast_dt, time_elem))
+            continue
+        precip_elem = time_elem.find(".//precipitation")
+        if precip_elem is not None and (forecast_dt not in periods or until < periods[forecast_dt][0]):
+            periods[forecast_dt] = (until, precip_elem)
+
+    for forecast_dt, time_elem in instants:
+        location = time_elem.find("location")
+        if forecast_dt in periods and location is not None and location.find("precipitation") is None:
+            location.append(periods[forecast_dt][1])
+    return instants
+
+def load_forecast_times(api_url):
+    """
+    Fetches and parses the forecast at api_url into a list of
+    (forecast datetime, <time> element) pairs, or None if unavailable.
+    Memoized per request, so segments sharing a forecast parse it once.
+    """
+    def parse():
+        cached_data = APICache.get_cached_response(api_url, timeout=900)
+        if not cached_data:
+            return None
+        try:
+            with metrics.timed("parse"):
+                root = ET.fromstring(cached_data)
+        except Exception:
+            return None
+        return parse_forecast_times(root)
+
+    return request_memo.memoize(("forecast_times", api_url), parse)
+
 def fetch_weather_at(lat, lon, target_dt):
     """
     Fetch weather forecast for a given latitude, longitude, and target datetime.
     Uses an external weather API and returns the forecast (or None if unavailable).
     """
-    api_url = f"http://openaccess.pf.api.met.ie/metno-wdb2ts/locationforecast?lat={lat};long={lon}"
-    cached_data = APICache.get_cached_response(api_url, timeout=900)
-    if not cached_data:
-        return None
-    try:
-        root = ET.fromstring(cached_data)
-    except Exception:
+    api_url = forecast_url(lat, lon)
+    return request_memo.memoize(
+        ("forecast_at", api_url, target_dt),
+        lambda: forecast_from_times(load_forecast_times(api_url), target_dt),
+    )
+
+def forecast_from_times(forecast_times, target_dt):
+    """Builds the forecast dict from the <time> element closest to target_dt."""
+    if not forecast_times:
         return None
 
     best_forecast = None
     best_diff = None
-    for time_elem in root.findall(".//time"):
-        forecast_time_str = time_elem.get("from")
-        try:
-            forecast_dt = datetime.strptime(forecast_time_str, "%Y-%m-%dT%H:%M:%SZ")
-        except Exception:
-            continue
+    for forecast_dt, time_elem in forecast_times:
         diff = abs((forecast_dt - target_dt).total_seconds())
         if best_diff is None or diff < best_diff:
             best_diff = diff
@@ -79,55 +133,94 @@ def fetch_weather_at(lat, lon, target_dt):
             return None
     return None
 
-def get_top_trails(activity_type, user_point, limit=5, max_distance_km=50):
+def get_top_trails(activity_type, user_point, limit=5, max_distance_km=50, geometry_field="route"):
     """
     Retrieve the top `limit` trails nearest to the provided user_point,
-    filtering out trails beyond max_distance_km.
+    filtering out trails beyond max_distance_km. Only the route column
+    named by geometry_field is loaded (none if it is None).
     """
     max_distance_filter = D(km=max_distance_km)
-    trails = Trail.objects.filter(route__distance_lte=(user_point, max_distance_filter))
+    trails = Trail.objects.filter(route__dwithin=(user_point, max_distance_filter))
 
     if activity_type == "Cycling":
         trails = trails.filter(activity="Cycling")
     elif activity_type == "Walking":
         trails = trails.filter(activity="Walking")
 
-    trails = trails.annotate(distance=Distance("route", user_point))\
+    unused_routes = [field for field in ROUTE_FIELDS if field != geometry_field]
+    trails = trails.defer(*unused_routes, "search_vector")\
+                   .annotate(distance=Distance("route", user_point))\
                    .order_by("distance")[:limit]
     return trails
 
 
-def get_segments_for_trail(trail, base_dt):
+def to_utc_hour(dt):
+    """Naive datetimes are taken as UTC; rounds to the nearest hour."""
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, dt_timezone.utc)
+    dt = dt.astimezone(dt_timezone.utc)
+    return dt.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1 if dt.minute >= 30 else 0)
+
+def get_segments_for_trails(trails, base_dt):
     """
-    For a given trail, process its segments.
+    For the given trails, process their segments.
     Each segment is enriched with:
       - forecast_datetime: base_dt plus the segment's time offset.
-      - weather: forecast data from fetch_weather_at().
+      - weather: the precomputed SegmentForecast for the hour the segment
+        is reached, falling back to fetch_weather_at() when there is none.
       - coordinates: the segment point's coordinates.
-    Returns a list of segment dictionaries.
+    All segments and their precomputed forecasts come from a single query.
+    Returns {trail id: list of segment dictionaries}.
     """
-    segments_list = []
-    segments_qs = trail.segments.all().order_by("segment_index")
+    base_hour = to_utc_hour(base_dt)
+    precomputed = SegmentForecast.objects.filter(
+        segment=OuterRef("pk"),
+        target_time=ExpressionWrapper(
+            Value(base_hour, output_field=DateTimeField()) + OuterRef("start_time_offset"),
+            output_field=DateTimeField(),
+        ),
+    ).values(forecast=JSONObject(
+        temperature="temperature",
+        cloudiness="cloudiness",
+        wind_speed="wind_speed",
+        wind_direction="wind_direction",
+        valid_time="valid_time",
+        rain="rain",
+    ))[:1]
+
+    segments_qs = TrailSegment.objects.filter(trail__in=[trail.pk for trail in trails]) \
+                                      .only("trail_id", "segment_index", "start_time_offset", "segment_point") \
+                                      .annotate(forecast=Subquery(precomputed, output_field=JSONField())) \
+                                      .order_by("trail_id", "segment_index")
+
+    segments_by_trail = {trail.pk: [] for trail in trails}
     for seg in segments_qs:
         seg_dt = base_dt + seg.start_time_offset
-        seg_lat = seg.segment_point.y  # GEOS stores points as (x, y) = (lon, lat)
-        seg_lon = seg.segment_point.x
-        forecast = fetch_weather_at(seg_lat, seg_lon, seg_dt)
-        segments_list.append({
+        if seg.forecast is not None:
+            forecast = seg.forecast
+            valid_time = datetime.fromisoformat(forecast.pop("valid_time")).astimezone(dt_timezone.utc)
+            forecast["forecast_time"] = valid_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+        else:
+            seg_lat = seg.segment_point.y  # GEOS stores points as (x, y) = (lon, lat)
+            seg_lon = seg.segment_point.x
+            forecast = fetch_weather_at(seg_lat, seg_lon, seg_dt)
+        segments_by_trail[seg.trail_id].append({
             "forecast_datetime": seg_dt.isoformat(),
             "weather": forecast,
             "coordinates": list(seg.segment_point.coords),
         })
-    return segments_list
+    return segments_by_trail
 
-def trail_to_geojson_feature(trail, segments_list):
+def trail_to_geojson_feature(trail, segments_list, geometry_field="route"):
     """
     Converts a Trail object (with its segments) to a GeoJSON feature.
-    The trail's route is used as the geometry, and its properties include
-    a list of segments enriched with weather data.
+    The trail's route (or the simplified route named by geometry_field) is
+    used as the geometry, and its properties include a list of segments
+    enriched with weather data.
     """
+    route = getattr(trail, geometry_field) or trail.route if geometry_field else None
     try:
-        route_geojson = json.loads(trail.route.geojson)
+        route_geojson = json.loads(route.geojson) if route is not None else None
     except Exception:
         route_geojson = None
     feature = {
@@ -156,22 +249,27 @@ def get_top_trails_weather_segments(request):
       - lon: longitude
       - datetime: base datetime (ISO 8601 string)
       - activity_type
+      - detail / tolerance: route level of detail, see geometry_field_from_request
     Returns a GeoJSON FeatureCollection.
     """
     if request.method != "GET":
         return JsonResponse({"error": "GET method required"}, status=400)
     try:
         lat, lon, base_dt, activity_type, max_distance_km = parse_parameters(request)
+        geometry_field = geometry_field_from_request(request)
     except ValueError as e:
         return JsonResponse({"error": str(e)}, status=400)
     
     user_point = Point(lon, lat, srid=4326)
-    trails = get_top_trails(activity_type, user_point, limit=5, max_distance_km=max_distance_km)
+    trails = get_top_trails(activity_type, user_point, limit=5, max_distance_km=max_distance_km,
+                            geometry_field=geometry_field)
     
+    trails = list(trails)
+    segments_by_trail = get_segments_for_trails(trails, base_dt)
+
     features = []
     for trail in trails:
-        segments_list = get_segments_for_trail(trail, base_dt)
-        feature = trail_to_geojson_feature(trail, segments_list)
+        feature = trail_to_geojson_feature(trail, segments_by_trail[trail.pk], geometry_field)
         features.append(feature)
     
     feature_collection = {
@@ -179,4 +277,6 @@ def get_top_trails_weather_segments(request):
         "features": features,
     }
     
-    return JsonResponse(feature_collection)
\ No newline at end of file
+    with metrics.timed("serialize"):
+        response = JsonResponse(feature_collection)
+    return response
\ No newline at end of file
@@ -0,0 +1,38 @@
+import os
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
+
+from ..utils import memory_profile, metrics
+
+
+def get_metrics(request):
+    """
+    Prometheus scrape endpoint for this worker's request, phase and cache
+    metrics.
+    """
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@staff_member_required
+def get_memory(request):
+    """
+    This worker's memory: peak RSS, cache usage by key prefix and the
+    per-route allocation profiles sampled by MemoryProfileMiddleware.
+    Staff only. max_rss_bytes is None where the resource module is
+    missing (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        max_rss = None
+    else:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+    return JsonResponse({
+        "pid": os.getpid(),
+        "max_rss_bytes": max_rss,
+        "cache": memory_profile.cache_usage(),
+        "profile_sample_rate": getattr(settings, "MEMORY_PROFILE_SAMPLE_RATE", 0),
+        "routes": memory_profile.profiles(),
+    })
@@ -0,0 +1,141 @@
+"""
+Forecasts along a driving route.
+
+The openrouteservice geometry is timed from the step durations, sampled at
+fixed intervals of driving time, and each sample gets the forecast for the
+hour the car gets there. Samples are snapped to a grid so nearby points (and
+other routes through the same area) share one Met Éireann forecast, and the
+number of samples is capped so upstream calls stay bounded however long the
+route is.
+"""
+import contextvars
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import connection
+
+from .get_top_trails_weather_segments import forecast_from_times, forecast_url, load_forecast_times
+
+ROUTE_WEATHER_INTERVAL_S = 30 * 60
+MAX_ROUTE_WEATHER_POINTS = 12
+GRID_CELL_DEGREES = 0.05  # ~5 km, coarser than the forecast model's grid
+MAX_CONCURRENT_FORECASTS = 6
+
+
+def haversine_m(a, b):
+    lon1, lat1, lon2, lat2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371000.0 * math.asin(math.sqrt(h))
+
+
+def time_route(coordinates, steps, total_duration):
+    """
+    Seconds from departure and metres travelled at every route vertex.
+    Each step's duration is spread over its way_points by distance; without
+    usable steps total_duration is spread over the whole route.
+    """
+    distances = [0.0]
+    for a, b in zip(coordinates, coordinates[1:]):
+        distances.append(distances[-1] + haversine_m(a, b))
+
+    # Time to drive the edge ending at each vertex
+    edge_seconds = [0.0] * len(coordinates)
+    for step in steps:
+        first, last = step.get("way_points", [0, 0])
+        span = distances[last] - distances[first]
+        for i in range(first + 1, last + 1):
+            share = (distances[i] - distances[i - 1]) / span if span else 1 / (last - first)
+            edge_seconds[i] = step.get("duration", 0) * share
+    if not any(edge_seconds) and distances[-1]:
+        edge_seconds = [total_duration * (distances[i] - distances[i - 1]) / distances[-1] if i else 0.0
+                        for i in range(len(coordinates))]
+
+    elapsed = []
+    seconds = 0.0
+    for edge in edge_seconds:
+        seconds += edge
+        elapsed.append(seconds)
+    return elapsed, distances
+
+
+def sample_route(coordinates, elapsed, distances):
+    """
+    (seconds, metres, (lon, lat)) every ROUTE_WEATHER_INTERVAL_S of driving
+    plus the destination, widening the interval to keep at most
+    MAX_ROUTE_WEATHER_POINTS samples.
+    """
+    total = elapsed[-1]
+    interval = max(ROUTE_WEATHER_INTERVAL_S, total / (MAX_ROUTE_WEATHER_POINTS - 1))
+    targets = [i * interval for i in range(int(total // interval) + 1)]
+    if total - targets[-1] > interval / 4 or len(targets) == 1:
+        targets.append(total)
+
+    samples = []
+    i = 0
+    for target in targets:
+        # Interpolate within the route edge (i, i + 1) driven at `target`
+        while i < len(elapsed) - 2 and elapsed[i + 1] < target:
+            i += 1
+        span = elapsed[i + 1] - elapsed[i]
+        f = min(1.0, max(0.0, (target - elapsed[i]) / span)) if span else 0.0
+        point = tuple(a + (b - a) * f for a, b in zip(coordinates[i], coordinates[i + 1]))
+        samples.append((target, distances[i] + (distances[i + 1] - distances[i]) * f, point))
+    return samples
+
+
+def grid_cell(lon, lat):
+    """Centre of the GRID_CELL_DEGREES cell containing the point, as (lat, lon)."""
+    def snap(value):
+        return round((math.floor(value / GRID_CELL_DEGREES) + 0.5) * GRID_CELL_DEGREES, 4)
+    return snap(lat), snap(lon)
+
+
+def load_forecast_in_worker(api_url):
+    """
+    load_forecast_times for a pool thread. The rate limit check opens a
+    database connection in the thread, and request_finished only closes the
+    request thread's, so close it here.
+    """
+    try:
+        return load_forecast_times(api_url)
+    finally:
+        connection.close()
+
+
+def route_weather(coordinates, steps, total_duration, depart):
+    """
+    Forecast legs along a route: one per sample, from the sample to the
+    next. depart is an aware datetime.
+    """
+    if len(coordinates) < 2:
+        return []
+    elapsed, distances = time_route(coordinates, steps, total_duration)
+    samples = sample_route(coordinates, elapsed, distances)
+
+    cells = {grid_cell(*point) for _, _, point in samples}
+    # Worker threads run in copies of this context so they share the
+    # request's memo and timing breakdown
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FORECASTS) as pool:
+        futures = {
+            cell: pool.submit(contextvars.copy_context().run, load_forecast_in_worker, forecast_url(*cell))
+            for cell in cells
+        }
+        forecasts = {cell: future.result() for cell, future in futures.items()}
+
+    legs = []
+    for index, (seconds, metres, (lon, lat)) in enumerate(samples):
+        arrival = depart + timedelta(seconds=seconds)
+        # Forecast times are naive UTC
+        target = arrival.astimezone(dt_timezone.utc).replace(tzinfo=None)
+        end = samples[index + 1] if index + 1 < len(samples) else (seconds, metres, None)
+        legs.append({
+            "location": [round(lat, 5), round(lon, 5)],
+            "arrival_time": arrival.isoformat(),
+            "start_elapsed": round(seconds),
+            "end_elapsed": round(end[0]),
+            "start_distance": round(metres),
+            "end_distance": round(end[1]),
+            "weather": forecast_from_times(forecasts[grid_cell(lon, lat)], target),
+        })
+    return legs
@@ -1,20 +1,46 @@
-import requests
 import json
+import math
+from datetime import datetime, timezone as dt_timezone
 
 
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.cache import cache_page
-from django.core.serializers import serialize
-from django.contrib.gis.geos import Point
-from django.contrib.gis.db.models.functions import Distance
 from django.conf import settings
 from django.core.cache import cache
-from django.contrib.gis.geos import Point
-from ..models import Trail
+from django.utils import timezone
+from ..utils import geocode_store
 from ..utils.api_cache import APICache
-
-
+from ..utils.http_cache import conditional_response, limit_freshness
+from ..utils.trail_geojson import (
+    ALL_TRAIL_FIELDS,
+    geometry_field_from_request,
+    nearest_trails_batch,
+    search_trails,
+    trails_along_route,
+    trail_feature_collection,
+    trail_page,
+)
+from ..utils.location_index import get_location_index
+from ..utils.rate_limit import UpstreamShed
+from ..utils.trail_clusters import MAX_CLUSTER_ZOOM, trail_clusters
+from .route_weather import route_weather
+
+
+LOCAL_SUGGESTIONS_MIN_RESULTS = 2
+MAX_SUGGESTION_QUERY_LENGTH = 100
+MAX_BATCH_ORIGINS = 50
+MAX_BATCH_LIMIT = 20
+DEFAULT_LISTING_LIMIT = 50
+MAX_LISTING_LIMIT = 200
+DEFAULT_CORRIDOR_KM = 5
+MAX_CORRIDOR_KM = 25
+MAX_CORRIDOR_POINTS = 10000
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 50
+LISTING_FIELDS = ('object_id', 'name', 'activity', 'county', 'length_km', 'difficulty')
+
+
+@conditional_response(60 * 60 * 24 * 7)
 def get_address(request):
     if request.method == "GET":
         address = request.GET.get("address")
@@ -22,23 +48,31 @@ def get_address(request):
         if not address:
             return JsonResponse({"error": "Address required"}, status=400)
 
+        entry = geocode_store.lookup_forward(address)
+        if entry:
+            return JsonResponse([{"longitude": entry.location.x, "latitude": entry.location.y, "address": entry.label}], safe=False)
+
         api_key = settings.LOCATION_API_KEY
 
         api_url = f"https://api.geocodify.com/v2/geocode?api_key={api_key}&q={address}"
 
-        data = APICache.get_cached_response(api_url, timeout=604800)
+        # The geocode store is the cache here, no need to also hold it in memory
+        data = APICache.fetch(api_url)
         if not data:
             return JsonResponse({"error": "Failed to fetch weather data"}, status=500)
 
         coordinates = data["response"]["features"][0]["geometry"]["coordinates"]
         longitude, latitude = coordinates
-        address = data["response"]["features"][0]["properties"]["label"]
+        label = data["response"]["features"][0]["properties"]["label"]
+        geocode_store.store_forward(address, label, latitude, longitude)
+        address = label
 
         values = []
 
         values.append({"longitude": longitude, "latitude": latitude, "address": address})
         return JsonResponse(values, safe=False)
     
+@conditional_response(60 * 60 * 24 * 7)
 def get_reverse_address(request):
     if request.method == "GET":
         latitude = request.GET.get("latitude")
@@ -47,14 +81,20 @@ def get_reverse_address(request):
         if not latitude or not longitude:
             return JsonResponse({"error": "Latitude and Longitude required"}, status=400)
 
+        try:
+            entry = geocode_store.lookup_reverse(latitude, longitude)
+        except ValueError:
+            return JsonResponse({"error": "Invalid latitude or longitude"}, status=400)
+        if entry:
+            return JsonResponse([{"longitude": longitude, "latitude": latitude, "address": entry.label}], safe=False)
+
         api_key = settings.LOCATION_API_KEY
 
         api_url = f"https://api.geocodify.com/v2/reverse?api_key={api_key}&lat={latitude}&lng={longitude}"
 
-        data = APICache.get_cached_response(api_url, timeout=604800)
+        data = APICache.fetch(api_url)
         if not data:
             return JsonResponse({"error": "Failed to fetch weather data"}, status=500)
-        print("DEBUG: ", data)
         if isinstance(data, str):
             try:
                 data = json.loads(data)
@@ -63,6 +103,7 @@ def get_reverse_address(request):
 
 
         address = data["response"]["features"][0]["properties"]["label"]
+        geocode_store.store_reverse(latitude, longitude, address)
         values = []
 
         values.append({"longitude": longitude, "latitude": latitude, "address": address})
@@ -94,13 +135,35 @@ def get_travel_mode_durations(start, destination):
 
     return durations    
 
+@conditional_response(600)
 def get_directions(request):
+    """
+    Driving directions between two "lat,lon" points (from, to).
+
+    With weather=true the response also lists the forecast along the route
+    (see route_weather), for a departure at `depart` (ISO 8601, naive is
+    UTC; default now).
+    """
     if request.method == "GET":
         start = request.GET.get("from")
         destination = request.GET.get("to")
         
         if not start or not destination:
             return JsonResponse({"error": "Locations required"}, status=400)
+
+        with_weather = request.GET.get("weather", "").lower() in ("1", "true", "yes")
+        try:
+            depart = request.GET.get("depart")
+            depart = datetime.fromisoformat(depart) if depart else None
+        except ValueError:
+            return JsonResponse({"error": "Invalid depart datetime"}, status=400)
+        if depart is None:
+            depart = timezone.now()
+            if with_weather:
+                # Arrival times count from now, so a stored copy is stale at once
+                limit_freshness(0)
+        if timezone.is_naive(depart):
+            depart = timezone.make_aware(depart, dt_timezone.utc)
         
         try:
             start = ','.join(start.split(',')[::-1])
@@ -162,16 +225,25 @@ def get_directions(request):
                 },
                 "instructions": instruction_steps,
             }
+            if with_weather:
+                response["weather"] = route_weather(
+                    feature.get("geometry", {}).get("coordinates", []),
+                    [step for segment in segments for step in segment.get("steps", [])],
+                    summary.get("duration", 0),
+                    depart,
+                )
 
             return JsonResponse(response)
             
         except json.JSONDecodeError:
             return JsonResponse({"error": "Invalid response format from API"}, status=500)
+        except UpstreamShed:
+            raise
         except Exception as e:
             return JsonResponse({"error": f"An error occurred: {str(e)}"}, status=500)
     
 @csrf_exempt
-@cache_page(60 * 60)
+@conditional_response(60 * 60)
 def get_all_trails(request):
     """
     Returns all trails as GeoJSON with:
@@ -184,18 +256,237 @@ def get_all_trails(request):
         geojson_data = cache.get(cache_key)
 
         if not geojson_data:
-            trails_qs = Trail.objects.all()
-            geojson_data = serialize(
-                'geojson',
-                trails_qs,
-                geometry_field='route', 
+            geojson_data = trail_feature_collection(
                 fields=('object_id', 'name', 'activity', 'length_km', 'difficulty')
             )
             cache.set(cache_key, geojson_data, 3600) # Cache for 1 hour
         
         return HttpResponse(geojson_data, content_type='application/json')
     
+def parse_listing_filters(request):
+    """Reads the trail listing filters from the query string. Raises ValueError."""
+    def values(name):
+        raw = request.GET.get(name)
+        return [value.strip() for value in raw.split(",") if value.strip()] if raw else None
+
+    filters = {name: values(name) for name in ("activity", "county", "difficulty")}
+    for name in ("min_length", "max_length"):
+        value = request.GET.get(name)
+        filters[name] = float(value) if value else None
+    bbox = request.GET.get("bbox")
+    if bbox:
+        filters["bbox"] = [float(value) for value in bbox.split(",")]
+        if len(filters["bbox"]) != 4:
+            raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    return filters
+
+
+@csrf_exempt
+@conditional_response(600)
+def get_trails(request):
+    """
+    Returns one page of trails as GeoJSON, filtered and ordered by id.
+
+    GET parameters (all optional):
+      - activity, county, difficulty: comma-separated values to match exactly
+      - min_length, max_length: length range in km
+      - bbox: min_lon,min_lat,max_lon,max_lat; trails whose route crosses it
+      - fields: comma-separated properties (default LISTING_FIELDS)
+      - detail / tolerance: route level of detail, see geometry_field_from_request
+      - limit: page size (default 50, max 200)
+      - after: the "next" cursor from the previous page
+
+    The response carries "next", the cursor of the following page, or null
+    on the last one.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=400)
+
+    try:
+        filters = parse_listing_filters(request)
+        fields = request.GET.get("fields")
+        fields = tuple(name.strip() for name in fields.split(",")) if fields else LISTING_FIELDS
+        unknown = [name for name in fields if name not in ALL_TRAIL_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        limit = int(request.GET.get("limit", DEFAULT_LISTING_LIMIT))
+        if not 1 <= limit <= MAX_LISTING_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_LISTING_LIMIT}")
+        after = request.GET.get("after")
+        after = int(after) if after else None
+        geometry_field = geometry_field_from_request(request)
+    except ValueError as e:
+        return JsonResponse({"error": f"Invalid request: {e}"}, status=400)
+
+    geojson_data = trail_page(filters, fields, geometry_field, after=after, limit=limit)
+    return HttpResponse(geojson_data, content_type="application/json")
+
 @csrf_exempt
+@conditional_response(600)
+def get_trail_search(request):
+    """
+    Searches trails by name, county, nearest towns and description.
+
+    GET parameters:
+      - q: search text; supports "quoted phrases", OR and -exclusions, and
+        tolerates typos in trail names
+      - lat, lon (optional): favour nearby trails and add distance_m
+      - max_distance (optional, km, needs lat/lon): only trails this close
+      - activity (optional): e.g. Walking or Cycling
+      - limit: number of results (default 20, max 50)
+      - detail / tolerance: route level of detail, see geometry_field_from_request
+
+    Returns a FeatureCollection ordered by score (highest first).
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=400)
+
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return JsonResponse({"error": "q parameter is required."}, status=400)
+
+    try:
+        lat = request.GET.get("lat")
+        lon = request.GET.get("lon")
+        point = (float(lon), float(lat)) if lat and lon else None
+        max_distance = request.GET.get("max_distance")
+        max_distance = float(max_distance) if max_distance and point else None
+        limit = int(request.GET.get("limit", DEFAULT_SEARCH_LIMIT))
+        if not 1 <= limit <= MAX_SEARCH_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_SEARCH_LIMIT}")
+        geometry_field = geometry_field_from_request(request)
+    except ValueError as e:
+        return JsonResponse({"error": f"Invalid request: {e}"}, status=400)
+
+    geojson_data = search_trails(
+        query, LISTING_FIELDS, geometry_field, point=point, max_distance_km=max_distance,
+        activity=request.GET.get("activity") or None, limit=limit,
+    )
+    return HttpResponse(geojson_data, content_type="application/json")
+
+def decode_polyline(encoded, precision=5):
+    """Decodes a Google encoded polyline into [[lon, lat], ...]."""
+    coordinates = []
+    index = lat = lon = 0
+    factor = 10 ** precision
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coordinates.append([lon / factor, lat / factor])
+    return coordinates
+
+
+def fetch_driving_route(start, destination):
+    """Route coordinates [[lon, lat], ...] between two "lat,lon" strings, or None."""
+    start = ','.join(start.split(',')[::-1])
+    destination = ','.join(destination.split(',')[::-1])
+    api_url = (f"https://api.openrouteservice.org/v2/directions/driving-car"
+               f"?api_key={settings.DIRECTIONS_API_KEY}&start={start}&end={destination}")
+    data = APICache.get_cached_response(api_url, timeout=600)
+    if isinstance(data, str):
+        data = json.loads(data)
+    if not data or not data.get("features"):
+        return None
+    return data["features"][0].get("geometry", {}).get("coordinates")
+
+
+@csrf_exempt
+@conditional_response(1800)
+def get_trails_along_route(request):
+    """
+    Returns the trails within a corridor around a route, in the order the
+    route passes them.
+
+    The route is either
+      - GET from, to: "lat,lon" points, routed by car as in get_directions, or
+      - POST JSON {"coordinates": [[lon, lat], ...]} or {"polyline": "..."}
+        (Google encoded polyline, precision 5)
+
+    Query parameters:
+      - distance: corridor half-width in km (default 5, max 25)
+      - activity (optional): e.g. Walking or Cycling
+      - limit: number of trails (default 50, max 200)
+      - detail / tolerance: route level of detail, see geometry_field_from_request
+    """
+    try:
+        distance = float(request.GET.get("distance", DEFAULT_CORRIDOR_KM))
+        if not 0 < distance <= MAX_CORRIDOR_KM:
+            raise ValueError(f"distance must be between 0 and {MAX_CORRIDOR_KM} km")
+        limit = int(request.GET.get("limit", DEFAULT_LISTING_LIMIT))
+        if not 1 <= limit <= MAX_LISTING_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_LISTING_LIMIT}")
+        geometry_field = geometry_field_from_request(request)
+
+        if request.method == "POST":
+            data = json.loads(request.body)
+            if "polyline" in data:
+                coordinates = decode_polyline(data["polyline"])
+            else:
+                coordinates = [[float(lon), float(lat)] for lon, lat, *_ in data["coordinates"]]
+        elif request.method == "GET":
+            if not request.GET.get("from") or not request.GET.get("to"):
+                raise ValueError("from and to are required")
+            coordinates = fetch_driving_route(request.GET["from"], request.GET["to"])
+            if coordinates is None:
+                return JsonResponse({"error": "Failed to fetch directions"}, status=500)
+        else:
+            return JsonResponse({"error": "GET or POST method required"}, status=400)
+
+        if not 2 <= len(coordinates) <= MAX_CORRIDOR_POINTS:
+            raise ValueError(f"The route must have between 2 and {MAX_CORRIDOR_POINTS} points")
+    except (json.JSONDecodeError, AttributeError, IndexError, KeyError, TypeError, ValueError) as e:
+        return JsonResponse({"error": f"Invalid request: {e}"}, status=400)
+
+    geojson_data = trails_along_route(
+        coordinates, distance, LISTING_FIELDS, geometry_field,
+        activity=request.GET.get("activity") or None, limit=limit,
+    )
+    return HttpResponse(geojson_data, content_type="application/json")
+
+# Not wrapped in conditional_response: every pan is a new bbox, so whole
+# responses would rarely be reused. The tiles they are built from are cached.
+@csrf_exempt
+def get_trail_clusters(request):
+    """
+    Returns clustered trail markers for a map view at low zoom levels.
+
+    GET parameters:
+      - bbox: min_lon,min_lat,max_lon,max_lat of the view
+      - zoom: map zoom level, 0 to 12
+      - activity (optional): e.g. Walking or Cycling
+
+    Returns {"zoom": zoom, "clusters": [{"count", "activities", "center",
+    "bbox"}, ...]}, with center and bbox in lon/lat.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=400)
+
+    try:
+        bbox = [float(value) for value in request.GET.get("bbox", "").split(",")]
+        if len(bbox) != 4 or not all(math.isfinite(value) for value in bbox):
+            raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+        zoom = int(request.GET.get("zoom", ""))
+        if not 0 <= zoom <= MAX_CLUSTER_ZOOM:
+            raise ValueError(f"zoom must be between 0 and {MAX_CLUSTER_ZOOM}")
+        clusters = trail_clusters(bbox, zoom, activity=request.GET.get("activity") or None)
+    except ValueError as e:
+        return JsonResponse({"error": f"Invalid request: {e}"}, status=400)
+
+    return HttpResponse(clusters, content_type="application/json")
+
+@csrf_exempt
+@conditional_response(1800)
 def get_top_trails_near_location(request):
     """
     Returns the top 5 trails nearest to a given location.
@@ -203,6 +494,7 @@ def get_top_trails_near_location(request):
     GET parameters:
       - lat: latitude
       - lon: longitude
+      - detail / tolerance: route level of detail, see geometry_field_from_request
       
     For each trail, we compute the distance from the given point to its
     'route' field (the closest distance) and return the entire DB object
@@ -222,27 +514,22 @@ def get_top_trails_near_location(request):
     except ValueError:
         return JsonResponse({"error": "Invalid lat or lon values."}, status=400)
 
-    cache_key = f"top_trails_{lat}_{lon}"
+    try:
+        geometry_field = geometry_field_from_request(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    cache_key = f"top_trails_{lat}_{lon}_{geometry_field}"
     geojson_data = cache.get(cache_key)
 
     if not geojson_data:
-        user_point = Point(lon, lat, srid=4326)
-        trails = Trail.objects.annotate(distance=Distance("route", user_point)) \
-                          .order_by("distance")[:5]
-
-        geojson_str = serialize("geojson", trails, geometry_field="route")
-        geojson_data = json.loads(geojson_str)
-
-        for feature, trail in zip(geojson_data["features"], trails):
-            feature["properties"]["distance_m"] = trail.distance.m
-        geojson_data = json.dumps(geojson_data)
+        geojson_data = trail_feature_collection(point=(lon, lat), limit=5, geometry_field=geometry_field)
         cache.set(cache_key, geojson_data, 1800)
-    else:
-        geojson_data = json.loads(geojson_data)
 
     return HttpResponse(geojson_data, content_type="application/json")
     
 @csrf_exempt
+@conditional_response(1800)
 def get_top_cycle_trails_near_location(request):
     """
     Returns the top 5 cycling trails nearest to a given location.
@@ -250,6 +537,7 @@ def get_top_cycle_trails_near_location(request):
     GET parameters:
       - lat: latitude
       - lon: longitude
+      - detail / tolerance: route level of detail, see geometry_field_from_request
       
     For each trail, we compute the distance from the given point to its
     'route' field (the closest distance) and return the entire DB object
@@ -269,30 +557,23 @@ def get_top_cycle_trails_near_location(request):
     except ValueError:
         return JsonResponse({"error": "Invalid lat or lon values."}, status=400)
 
-    cache_key = f"top_cycle_trails_{lat}_{lon}"
+    try:
+        geometry_field = geometry_field_from_request(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    cache_key = f"top_cycle_trails_{lat}_{lon}_{geometry_field}"
     geojson_data = cache.get(cache_key)
     if not geojson_data:
-        user_point = Point(lon, lat, srid=4326)
-
-        trails = Trail.objects.filter(activity="Cycling") \
-                            .annotate(distance=Distance("route", user_point)) \
-                            .order_by("distance")[:5]
-
-
-        geojson_str = serialize("geojson", trails, geometry_field="route")
-        geojson_data = json.loads(geojson_str)
-
-        for feature, trail in zip(geojson_data["features"], trails):
-            feature["properties"]["distance_m"] = trail.distance.m
-        geojson_data = json.dumps(geojson_data)
+        geojson_data = trail_feature_collection(point=(lon, lat), activity="Cycling", limit=5,
+                                                geometry_field=geometry_field)
         cache.set(cache_key, geojson_data, 1800)
-    else:
-        geojson_data = json.loads(geojson_data)
 
     return HttpResponse(geojson_data, content_type="application/json")
 
 
 @csrf_exempt
+@conditional_response(1800)
 def get_top_walking_trails_near_location(request):
     """
     Returns the top 5 walking trails nearest to a given location.
@@ -300,6 +581,7 @@ def get_top_walking_trails_near_location(request):
     GET parameters:
       - lat: latitude
       - lon: longitude
+      - detail / tolerance: route level of detail, see geometry_field_from_request
       
     For each trail, we compute the distance from the given point to its
     'route' field (the closest distance) and return the entire DB object
@@ -319,105 +601,114 @@ def get_top_walking_trails_near_location(request):
     except ValueError:
         return JsonResponse({"error": "Invalid lat or lon values."}, status=400)
 
-    cache_key = f"top_walking_trails_{lat}_{lon}"
+    try:
+        geometry_field = geometry_field_from_request(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    cache_key = f"top_walking_trails_{lat}_{lon}_{geometry_field}"
     geojson_data = cache.get(cache_key)
     if not geojson_data:
-        user_point = Point(lon, lat, srid=4326)
+        geojson_data = trail_feature_collection(point=(lon, lat), activity="Walking", limit=5,
+                                                geometry_field=geometry_field)
+        cache.set(cache_key, geojson_data, 1800)
 
-        trails = Trail.objects.filter(activity="Walking") \
-                            .annotate(distance=Distance("route", user_point)) \
-                            .order_by("distance")[:5]
+    return HttpResponse(geojson_data, content_type="application/json")
 
+@csrf_exempt
+def get_top_trails_batch(request):
+    """
+    Returns the nearest trails for many origins in one request and one query.
 
-        geojson_str = serialize("geojson", trails, geometry_field="route")
-        geojson_data = json.loads(geojson_str)
+    POST body (JSON):
+      {"origins": [{"lat": 53.35, "lon": -6.26, "activity": "Cycling", "limit": 5}, ...]}
+    activity is optional, limit defaults to 5. The detail / tolerance query
+    parameters select the route level of detail as for the other top-trails
+    endpoints.
 
-        for feature, trail in zip(geojson_data["features"], trails):
-            feature["properties"]["distance_m"] = trail.distance.m
-        geojson_data = json.dumps(geojson_data)
-        cache.set(cache_key, geojson_data, 1800)
-    else:
-        geojson_data = json.loads(geojson_data)
+    Returns {"results": [...]}, one FeatureCollection (with its origin) per
+    origin, in the order given.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST method required"}, status=400)
 
+    try:
+        data = json.loads(request.body)
+        origins = data.get("origins")
+        if not isinstance(origins, list) or not origins:
+            raise ValueError("origins must be a non-empty list")
+        if len(origins) > MAX_BATCH_ORIGINS:
+            raise ValueError(f"At most {MAX_BATCH_ORIGINS} origins are allowed")
+
+        cleaned = []
+        for origin in origins:
+            limit = int(origin.get("limit", 5))
+            if not 1 <= limit <= MAX_BATCH_LIMIT:
+                raise ValueError(f"limit must be between 1 and {MAX_BATCH_LIMIT}")
+            cleaned.append({
+                "lat": float(origin["lat"]),
+                "lon": float(origin["lon"]),
+                "activity": origin.get("activity") or None,
+                "limit": limit,
+            })
+        geometry_field = geometry_field_from_request(request)
+    except (json.JSONDecodeError, AttributeError, KeyError, TypeError, ValueError) as e:
+        return JsonResponse({"error": f"Invalid request: {e}"}, status=400)
+
+    geojson_data = nearest_trails_batch(cleaned, geometry_field=geometry_field)
     return HttpResponse(geojson_data, content_type="application/json")
 
 @csrf_exempt
+@conditional_response(60 * 60)
 def get_location_suggestions(request):
+    """
+    Autocomplete for the location search box.
+
+    Answered from the in-process gazetteer (prefix and typo-tolerant
+    matches) when it has enough results; otherwise falls back to the
+    geocodify suggest API and remembers what it returns.
+    """
     if request.method == "GET":
         query = request.GET.get("query", "")
         
         if not query or len(query) < 2:
             return JsonResponse([], safe=False)
-            
-        # Use the geocodify API with improved fuzzy search parameters
-        api_key = settings.LOCATION_API_KEY
-        cache_key = f"location_suggestions_{query}"
-        suggestions = cache.get(cache_key)
-        if suggestions is not None:
+        if len(query) > MAX_SUGGESTION_QUERY_LENGTH:
+            return JsonResponse({"error": f"query must be at most {MAX_SUGGESTION_QUERY_LENGTH} characters"}, status=400)
+
+        index = get_location_index()
+        suggestions = index.suggest(query)
+        if len(suggestions) >= LOCAL_SUGGESTIONS_MIN_RESULTS:
             return JsonResponse(suggestions, safe=False)
-        
-        # Try with higher fuzzy value for better typo tolerance
+
+        # Not enough local matches, ask geocodify with fuzzy matching enabled
+        api_key = settings.LOCATION_API_KEY
         api_url = f"https://api.geocodify.com/v2/suggest?api_key={api_key}&q={query}&fuzzy=2&bias=ie"
         
         try:
             data = APICache.get_cached_response(api_url, timeout=3600)
             if not data:
-                return JsonResponse([], safe=False)
+                return JsonResponse(suggestions, safe=False)
 
-            suggestions = []
-            
+            seen = {suggestion["value"] for suggestion in suggestions}
             for feature in data.get("response", {}).get("features", []):
                 props = feature.get("properties", {})
+                label = props.get("label")
+                longitude, latitude = feature["geometry"]["coordinates"][:2]
+                index.learn(label, latitude, longitude, id=props.get("id") or label)
+                if label in seen:
+                    continue
+                seen.add(label)
                 suggestions.append({
                     "id": props.get("id"),
-                    "label": props.get("label"),
-                    "value": props.get("label"),
-                    "longitude": feature["geometry"]["coordinates"][0],
-                    "latitude": feature["geometry"]["coordinates"][1]
+                    "label": label,
+                    "value": label,
+                    "longitude": longitude,
+                    "latitude": latitude
                 })
-            
-            # If we have no results or very few, also try with common Irish city spelling corrections
-            if len(suggestions) < 2:
-                common_cities = {
-                    "galwy": "galway", 
-                    "dubln": "dublin", 
-                    "dablinn": "dublin",
-                    "cark": "cork", 
-                    "limerik": "limerick",
-                    "waterfrd": "waterford",
-                    "kilkeny": "kilkenny",
-                    "slgo": "sligo"
-                }
-                
-                corrected_query = None
-                # Check if the query is a misspelling of a common city
-                for misspelled, correct in common_cities.items():
-                    if query.lower().startswith(misspelled) or misspelled.startswith(query.lower()):
-                        corrected_query = correct
-                        break
-                
-                # If we found a potential correction, try again with the corrected city name
-                if corrected_query:
-                    corrected_url = f"https://api.geocodify.com/v2/suggest?api_key={api_key}&q={corrected_query}&bias=ie"
-                    corrected_response = requests.get(corrected_url)
-                    
-                    if corrected_response.status_code == 200:
-                        corrected_data = json.loads(corrected_response.text)
-                        
-                        for feature in corrected_data.get("response", {}).get("features", []):
-                            props = feature.get("properties", {})
-                            # Add a note that this was a correction
-                            label = props.get("label")
-                            suggestions.append({
-                                "id": props.get("id"),
-                                "label": f"{label} (Did you mean: {corrected_query.title()}?)",
-                                "value": label,
-                                "longitude": feature["geometry"]["coordinates"][0],
-                                "latitude": feature["geometry"]["coordinates"][1]
-                            })
                 
             return JsonResponse(suggestions, safe=False)
             
         except Exception as e:
             print(f"Error fetching suggestions: {str(e)}")
-            return JsonResponse([], safe=False)
\ No newline at end of file
+            return JsonResponse(suggestions, safe=False)
@@ -2,18 +2,31 @@ import requests
 import platform
 import xml.etree.ElementTree as ET
 import json
-from datetime import datetime
+import math
+from datetime import date, datetime, time as dt_time, timedelta, timezone
 
-from django.http import JsonResponse
+from django.db.models import F
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.gis.geos import Point
 from django.contrib.gis.measure import D
 from django.contrib.gis.geos import Point
-from ..models import WeatherAlert
+from ..models import Trail, WeatherAlert
+from ..utils import metrics
 from ..utils.api_cache import APICache
+from ..utils.http_cache import conditional_response, limit_freshness
+from ..utils.solar import sun_times
+from ..utils.trail_geojson import alert_affected_trails, geometry_field_from_request
+
+
+MAX_SOLAR_DAYS = 31
+# The sunrise equation drifts by minutes within a few centuries of J2000
+MIN_SOLAR_DATE = date(1900, 1, 1)
+MAX_SOLAR_DATE = date(2100, 12, 31)
 
 
 @csrf_exempt
+@conditional_response(900)
 def get_weather(request):
     if request.method == "GET":
         lat = request.GET.get("lat")
@@ -29,7 +42,8 @@ def get_weather(request):
         if not cached_data:
             return JsonResponse({"error": "Failed to fetch weather data"}, status=500)
         try:
-            root = ET.fromstring(cached_data)
+            with metrics.timed("parse"):
+                root = ET.fromstring(cached_data)
         except ET.ParseError:
             return JsonResponse({"error": "Failed to parse weather data"}, status=500)
 
@@ -71,7 +85,24 @@ def get_weather(request):
 
             return JsonResponse(values, safe=False)
 
+def format_solar_time(dt):
+    """Formats like sunrise-sunset.org did, e.g. "7:27:02 AM" (UTC)."""
+    if dt is None:
+        return None
+    return f"{dt.hour % 12 or 12}:{dt:%M:%S} {dt:%p}"
+
+@conditional_response(60 * 60)
 def get_solar(request):
+    """
+    Sunrise, sunset and twilight times computed locally.
+
+    GET parameters:
+      - lat, lon: location
+      - date: first day (YYYY-MM-DD, UTC, MIN_SOLAR_DATE-MAX_SOLAR_DATE), defaults to today
+      - days: number of consecutive days to return (1-MAX_SOLAR_DAYS), defaults to 1
+    Returns one entry per day; "rise" and "set" keep the format of the
+    previous sunrise-sunset.org response.
+    """
     if request.method == "GET":
         lat = request.GET.get("lat")
         lon = request.GET.get("lon")
@@ -79,19 +110,47 @@ def get_solar(request):
         if not lat or not lon:
             return JsonResponse({"error": "Latitude and longitude required"}, status=400)
 
-        api_url = f"https://api.sunrise-sunset.org/json?lat={lat}&lng={lon}"
-
-        cached_data = APICache.get_cached_response(api_url, timeout=43200)
-        
-        if not cached_data:
-            return JsonResponse({"error": "Failed to fetch solar data"}, status=500)
-
         try:
-            sunrise_time = cached_data["results"]["sunrise"]
-            sunset_time = cached_data["results"]["sunset"]
-            return JsonResponse([{"rise": sunrise_time, "set": sunset_time}], safe=False)
-        except (KeyError, TypeError):
-            return JsonResponse({"error": "Failed to parse solar data"}, status=500)
+            lat = float(lat)
+            lon = float(lon)
+            date_str = request.GET.get("date")
+            now = datetime.now(timezone.utc)
+            start_date = date.fromisoformat(date_str) if date_str else now.date()
+            days = int(request.GET.get("days", 1))
+        except ValueError:
+            return JsonResponse({"error": "Invalid lat, lon, date or days"}, status=400)
+
+        if not (math.isfinite(lat) and math.isfinite(lon) and -90 <= lat <= 90 and -180 <= lon <= 180):
+            return JsonResponse({"error": "lat must be between -90 and 90 and lon between -180 and 180"}, status=400)
+        if not 1 <= days <= MAX_SOLAR_DAYS:
+            return JsonResponse({"error": f"days must be between 1 and {MAX_SOLAR_DAYS}"}, status=400)
+        if not MIN_SOLAR_DATE <= start_date <= MAX_SOLAR_DATE - timedelta(days=days - 1):
+            return JsonResponse(
+                {"error": f"dates must be between {MIN_SOLAR_DATE} and {MAX_SOLAR_DATE}"}, status=400
+            )
+        if not date_str:
+            # "Today" changes at midnight UTC
+            midnight = datetime.combine(start_date + timedelta(days=1), dt_time(), tzinfo=timezone.utc)
+            limit_freshness((midnight - now).total_seconds())
+
+        values = []
+        for day, events in sun_times(lat, lon, start_date, days):
+            rise, set_ = events["sunrise"]
+            values.append({
+                "date": day.isoformat(),
+                "rise": format_solar_time(rise),
+                "set": format_solar_time(set_),
+                "solar_noon": format_solar_time(events["solar_noon"]),
+                "day_length": events["day_length"],
+                "civil_twilight_begin": format_solar_time(events["civil"][0]),
+                "civil_twilight_end": format_solar_time(events["civil"][1]),
+                "nautical_twilight_begin": format_solar_time(events["nautical"][0]),
+                "nautical_twilight_end": format_solar_time(events["nautical"][1]),
+                "astronomical_twilight_begin": format_solar_time(events["astronomical"][0]),
+                "astronomical_twilight_end": format_solar_time(events["astronomical"][1]),
+            })
+
+        return JsonResponse(values, safe=False)
 
 @csrf_exempt
 def get_weather_alerts(request):
@@ -108,7 +167,7 @@ def get_weather_alerts(request):
         # Get active alerts within 50km radius
         alerts = WeatherAlert.objects.filter(
             is_active=True,
-            location__distance_lte=(user_location, D(km=50))
+            location__dwithin=(user_location, D(km=50))
         ).values(
             'title', 
             'description', 
@@ -117,4 +176,64 @@ def get_weather_alerts(request):
             'end_time'
         )
         
-        return JsonResponse(list(alerts), safe=False)
\ No newline at end of file
+        return JsonResponse(list(alerts), safe=False)
+
+
+@csrf_exempt
+def get_trail_alerts(request, object_id):
+    """
+    Returns the current weather alerts affecting a trail (by object_id),
+    nearest first, from the trail/alert impact index.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=400)
+
+    alerts = WeatherAlert.objects.filter(
+        impacts__trail__object_id=object_id,
+        is_active=True,
+        end_time__gt=datetime.now(timezone.utc),
+    ).values(
+        'id',
+        'title',
+        'description',
+        'severity',
+        'start_time',
+        'end_time',
+        distance_m=F('impacts__distance_m'),
+    ).order_by('distance_m')
+
+    alerts = list(alerts)
+    if not alerts and not Trail.objects.filter(object_id=object_id).exists():
+        return JsonResponse({"error": "Trail not found"}, status=404)
+    return JsonResponse(alerts, safe=False)
+
+
+@csrf_exempt
+@conditional_response(300)
+def get_alert_affected_trails(request):
+    """
+    Returns the trails affected by current weather alerts as GeoJSON, each
+    with its alerts.
+
+    GET parameters (all optional):
+      - alert: only trails affected by this alert id
+      - severity: comma-separated severities, e.g. SEVERE,EXTREME
+      - detail / tolerance: route level of detail, see geometry_field_from_request
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "GET method required"}, status=400)
+
+    try:
+        alert_id = request.GET.get("alert")
+        alert_id = int(alert_id) if alert_id else None
+        severity = request.GET.get("severity")
+        severities = [value.strip().upper() for value in severity.split(",")] if severity else None
+        geometry_field = geometry_field_from_request(request)
+    except ValueError as e:
+        return JsonResponse({"error": f"Invalid request: {e}"}, status=400)
+
+    geojson_data = alert_affected_trails(
+        ('object_id', 'name', 'activity', 'county', 'length_km', 'difficulty'),
+        geometry_field, alert_id=alert_id, severities=severities,
+    )
+    return HttpResponse(geojson_data, content_type="application/json")
@@ -9,7 +9,9 @@ https://docs.djangoproject.com/en/5.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
+import getpass
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 import environ
@@ -40,12 +42,18 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.gis',
+    'django.contrib.postgres',
     'api',
     'leaflet',
     'corsheaders'
 ]
 
 MIDDLEWARE = [
+    'api.middleware.TimingMiddleware',
+    'api.middleware.RequestMemoMiddleware',
+    'api.middleware.UpstreamShedMiddleware',
+    'api.middleware.TrafficCaptureMiddleware',
+    'api.middleware.MemoryProfileMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -151,4 +159,33 @@ env = environ.Env()
 env.read_env(BASE_DIR / ".env")
 
 LOCATION_API_KEY = env("LOCATION_API_KEY")
-DIRECTIONS_API_KEY = env("DIRECTIONS_API_KEY")
\ No newline at end of file
+DIRECTIONS_API_KEY = env("DIRECTIONS_API_KEY")
+# Upstream token buckets shared by all workers (see api/utils/rate_limit.py):
+# rate is calls per second, burst the bucket size. Keep below each plan's quota.
+UPSTREAM_RATE_LIMITS = {
+    "met_eireann": {"rate": 10, "burst": 20},
+    "geocodify": {"rate": 2, "burst": 10},
+    "openrouteservice": {"rate": 0.6, "burst": 20},  # 40 directions/minute
+}
+
+# Warm restarts: each worker snapshots its cache here and reloads it at boot
+# (see api/utils/cache_snapshot.py). The last worker to save wins, so a
+# snapshot holds one worker's entries. Its directory must be private to the
+# app's user; set CACHE_SNAPSHOT_PATH= to disable.
+CACHE_SNAPSHOT_PATH = env(
+    "CACHE_SNAPSHOT_PATH",
+    default=os.path.join(tempfile.gettempdir(), f"weather-cache-{getpass.getuser()}", "cache_snapshot.bin"),
+) or None
+CACHE_SNAPSHOT_INTERVAL = 300  # seconds
+CACHE_SNAPSHOT_MAX_BYTES = 50 * 1024 * 1024
+CACHE_SNAPSHOT_MAX_AGE = 60 * 60  # Older snapshots are ignored
+
+# Request sampling for the replay_traffic command; unset to disable
+TRAFFIC_CAPTURE_PATH = env("TRAFFIC_CAPTURE_PATH", default=None)
+TRAFFIC_CAPTURE_SAMPLE_RATE = env.float("TRAFFIC_CAPTURE_SAMPLE_RATE", default=0.01)
+
+# Fraction of requests traced with tracemalloc for the /memory endpoint
+# (see api/utils/memory_profile.py); 0 disables
+MEMORY_PROFILE_SAMPLE_RATE = env.float("MEMORY_PROFILE_SAMPLE_RATE", default=0)
+MEMORY_PROFILE_FRAMES = 5  # Stack depth recorded per allocation
+MEMORY_PROFILE_TOP_SITES = 10  # Allocation sites kept per traced request
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather.settings')
 
 application = get_wsgi_application()
+
+from api.utils import cache_snapshot  # noqa: E402  (needs the app registry)
+
+cache_snapshot.start()